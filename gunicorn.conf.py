@@ -0,0 +1,8 @@
+# Loaded automatically by gunicorn from the working directory.
+
+
+def post_request(worker, req, environ, resp):
+    # Imported lazily: Django settings are only configured once the app is loaded
+    from sales.watchdog import check_worker_memory
+
+    check_worker_memory(worker)
@@ -1,3 +1,211 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.paginator import Paginator
+from django.db import connections, router, transaction
+from django.utils.functional import cached_property
 
-# Register your models here.
+from .changes import record_changes
+from .models import (
+    ChangeLogEntry, DailySummary, ReportSummary, Shop, ShopMembership, Vegetable, VegetableReport, VegetableSale,
+)
+from .summaries import recompute_daily_summaries
+
+# Counts above this are estimated rather than computed with COUNT(*)
+EXACT_COUNT_LIMIT = 10000
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that avoids a full COUNT(*) on large tables.
+
+    Unfiltered changelists use the database's own row estimate; filtered ones
+    count at most EXACT_COUNT_LIMIT rows plus one, so the last pages of a huge
+    result are not reachable by number but the page never scans the whole table.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = self._estimated_table_rows(queryset)
+            if estimate is not None and estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return queryset[:EXACT_COUNT_LIMIT + 1].count()
+
+    def _estimated_table_rows(self, queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table])
+            elif connection.vendor == 'mysql':
+                cursor.execute(
+                    "SELECT table_rows FROM information_schema.tables "
+                    "WHERE table_schema = DATABASE() AND table_name = %s", [table]
+                )
+            elif connection.vendor == 'sqlite':
+                # Rowids only grow, so the largest one bounds the row count from the rowid index
+                cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+            else:
+                return None
+            row = cursor.fetchone()
+        return int(row[0]) if row and row[0] is not None and row[0] >= 0 else None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist settings for tables that grow to millions of rows."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    date_hierarchy = 'date'
+    # Served by each table's (date, id) index, and stable enough for keyset-style paging
+    ordering = ('-date', '-id')
+    list_per_page = 100
+
+
+class VegetableSearchMixin:
+    """Search by vegetable name through the small catalog, then filter on the indexed key."""
+    search_fields = ('vegetable__name',)
+    search_help_text = "Vegetable name prefix"
+
+    def get_search_results(self, request, queryset, search_term):
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+        vegetable_ids = Vegetable.objects.filter(name__istartswith=search_term).values_list('id', flat=True)
+        return queryset.filter(vegetable_id__in=list(vegetable_ids)), False
+
+
+def _ids_by_shop(queryset):
+    ids = {}
+    for shop_id, row_id in queryset.values_list('shop_id', 'id'):
+        ids.setdefault(shop_id, []).append(row_id)
+    return ids
+
+
+class ChangeFeedAdminMixin:
+    """Log admin saves and deletes to the change feed so they reach offline clients."""
+    change_kind = None
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            super().save_model(request, obj, form, change)
+            record_changes(obj.shop_id, self.change_kind, [obj.id])
+
+    def delete_model(self, request, obj):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            record_changes(obj.shop_id, self.change_kind, [obj.id], deleted=True)
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            for shop_id, ids in _ids_by_shop(queryset).items():
+                record_changes(shop_id, self.change_kind, ids, deleted=True)
+            super().delete_queryset(request, queryset)
+
+
+@admin.action(description="Recompute daily summaries for selected dates")
+def recompute_summaries(modeladmin, request, queryset):
+    summaries = recompute_daily_summaries(queryset)
+    modeladmin.message_user(request, f"Recomputed {len(summaries)} daily summaries.", messages.SUCCESS)
+
+
+class ShopMembershipInline(admin.TabularInline):
+    model = ShopMembership
+    raw_id_fields = ('user',)
+    extra = 0
+
+
+@admin.register(Shop)
+class ShopAdmin(admin.ModelAdmin):
+    list_display = ('name', 'slug', 'database')
+    prepopulated_fields = {'slug': ('name',)}
+    inlines = [ShopMembershipInline]
+
+
+@admin.register(Vegetable)
+class VegetableAdmin(admin.ModelAdmin):
+    """Read-only: catalog rows are created normalized by sales.catalog and never renamed or removed."""
+    list_display = ('name',)
+    search_fields = ('name',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+class VegetableSaleAdminForm(forms.ModelForm):
+    """Carries the version the operator loaded, so a stale form cannot overwrite newer edits."""
+    loaded_version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = VegetableSale
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.fields['loaded_version'].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if self.instance.pk:
+            # The admin runs the whole change view in one transaction, so the lock holds until the save
+            current = VegetableSale.objects.select_for_update().filter(pk=self.instance.pk).values_list(
+                'version', flat=True
+            ).first()
+            if current != cleaned_data.get('loaded_version'):
+                raise forms.ValidationError(
+                    "Someone else changed this sale after you opened it. Reload the page to see their values."
+                )
+        return cleaned_data
+
+
+@admin.register(VegetableSale)
+class VegetableSaleAdmin(ChangeFeedAdminMixin, VegetableSearchMixin, LargeTableAdmin):
+    list_display = ('date', 'shop', 'vegetable', 'quantity', 'purchase_price', 'selling_price', 'version')
+    list_select_related = ('shop', 'vegetable')
+    list_filter = ('shop',)
+    raw_id_fields = ('vegetable',)
+    readonly_fields = ('version',)
+    form = VegetableSaleAdminForm
+    actions = [recompute_summaries]
+    change_kind = ChangeLogEntry.SALE
+
+    def save_model(self, request, obj, form, change):
+        # Admin edits bump the version like any other edit; the form checked it is still current
+        if change:
+            obj.version = form.cleaned_data['loaded_version'] + 1
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(VegetableReport)
+class VegetableReportAdmin(VegetableSearchMixin, LargeTableAdmin):
+    list_display = ('date', 'shop', 'vegetable', 'quantity', 'total_purchase', 'total_selling', 'profit', 'loss')
+    list_select_related = ('shop', 'vegetable')
+    list_filter = ('shop',)
+    raw_id_fields = ('vegetable',)
+
+
+@admin.register(DailySummary)
+class DailySummaryAdmin(ChangeFeedAdminMixin, LargeTableAdmin):
+    list_display = ('date', 'shop', 'total_purchase_price', 'total_selling_price', 'total_profit', 'total_loss')
+    list_select_related = ('shop',)
+    list_filter = ('shop',)
+    actions = ['recompute_selected']
+    change_kind = ChangeLogEntry.SUMMARY
+
+    @admin.action(description="Recompute selected daily summaries")
+    def recompute_selected(self, request, queryset):
+        sales = VegetableSale.objects.filter(shop_id__in=queryset.values('shop_id'), date__in=queryset.values('date'))
+        recompute_summaries(self, request, sales)
+
+
+@admin.register(ReportSummary)
+class ReportSummaryAdmin(LargeTableAdmin):
+    list_display = ('date', 'shop', 'total_purchase', 'total_selling', 'profit', 'loss')
+    list_select_related = ('shop',)
+    list_filter = ('shop',)
@@ -0,0 +1,231 @@
+import hashlib
+import json
+import os
+import shutil
+from datetime import date
+
+import numpy as np
+from django.conf import settings
+from django.db import router, transaction
+
+from . import catalog
+from .changes import record_changes
+from .models import ArchivedMonth, ChangeLogEntry, VegetableSale
+
+FORMAT_VERSION = 1
+
+# Column files of an archived month. Vegetables are stored as codes into the
+# month's own name dictionary, since catalog ids differ between databases.
+COLUMNS = {
+    'id': np.int64,
+    'date': np.int32,  # date.toordinal()
+    'vegetable': np.int32,
+    'quantity': np.float64,  # NaN where the field was blank
+    'purchase_price': np.float64,
+    'selling_price': np.float64,
+    'version': np.int32,
+}
+MANIFEST = 'manifest.json'
+
+
+ARCHIVED_MESSAGE = "This month is archived and read-only. Restore it with `manage.py restore_sales` to edit."
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def month_bounds(month):
+    """First day of ``month`` and of the month after it."""
+    start = month.replace(day=1)
+    return start, date(start.year + start.month // 12, start.month % 12 + 1, 1)
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _month_dir(archived):
+    return settings.SALES_ARCHIVE_ROOT / archived.path
+
+
+def _write_month(directory, shop, month, rows):
+    """Write the column files and manifest for ``rows`` into ``directory``."""
+    directory.mkdir(parents=True, exist_ok=True)
+    names = sorted({row['vegetable__name'] for row in rows})
+    codes = {name: code for code, name in enumerate(names)}
+
+    columns = {
+        'id': [row['id'] for row in rows],
+        'date': [row['date'].toordinal() for row in rows],
+        'vegetable': [codes[row['vegetable__name']] for row in rows],
+        'quantity': [row['quantity'] for row in rows],
+        'purchase_price': [row['purchase_price'] for row in rows],
+        'selling_price': [row['selling_price'] for row in rows],
+        'version': [row['version'] for row in rows],
+    }
+    checksums = {}
+    for name, dtype in COLUMNS.items():
+        filename = f'{name}.npy'
+        np.save(directory / filename, np.array(columns[name], dtype=dtype), allow_pickle=False)
+        checksums[filename] = _sha256(directory / filename)
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'shop': shop.slug,
+        'month': month.strftime('%Y-%m'),
+        'rows': len(rows),
+        'vegetables': names,
+        'checksums': checksums,
+    }
+    with open(directory / MANIFEST, 'w') as handle:
+        json.dump(manifest, handle, indent=2)
+        handle.flush()
+        os.fsync(handle.fileno())
+    return _sha256(directory / MANIFEST)
+
+
+def read_manifest(archived):
+    with open(_month_dir(archived) / MANIFEST) as handle:
+        return json.load(handle)
+
+
+def verify_month(archived):
+    """Check the manifest and every column file against their checksums; raise ArchiveError on mismatch."""
+    directory = _month_dir(archived)
+    if _sha256(directory / MANIFEST) != archived.checksum:
+        raise ArchiveError(f"{archived}: manifest checksum mismatch")
+    manifest = read_manifest(archived)
+    for filename, checksum in manifest['checksums'].items():
+        if _sha256(directory / filename) != checksum:
+            raise ArchiveError(f"{archived}: {filename} checksum mismatch")
+    for name in COLUMNS:
+        if len(np.load(directory / f'{name}.npy', mmap_mode='r')) != archived.row_count:
+            raise ArchiveError(f"{archived}: {name} has the wrong number of rows")
+    return manifest
+
+
+def load_month(archived):
+    """Memory-map the columns of an archived month, with vegetables mapped to catalog ids.
+
+    Returns a dict of arrays keyed like COLUMNS, with ``vegetable_id`` in place
+    of ``vegetable``. Only the pages actually touched are read from disk.
+    """
+    directory = _month_dir(archived)
+    manifest = read_manifest(archived)
+    columns = {name: np.load(directory / f'{name}.npy', mmap_mode='r') for name in COLUMNS}
+
+    ids = catalog.get_vegetable_ids(manifest['vegetables'])
+    lookup = np.array([ids[name] for name in manifest['vegetables']], dtype=np.int64)
+    columns['vegetable_id'] = lookup[columns.pop('vegetable')] if len(lookup) else np.empty(0, dtype=np.int64)
+    return columns
+
+
+def archived_months(shop, days):
+    """First days of the archived months among ``days``; writes to those dates are refused."""
+    months = {day.replace(day=1) for day in days}
+    if not months:
+        return set()
+    return set(ArchivedMonth.objects.filter(shop=shop, month__in=months).values_list('month', flat=True))
+
+
+def is_archived(shop, day):
+    return bool(archived_months(shop, [day]))
+
+
+def archived_sales(shop, start, end, vegetable_id=None):
+    """Archived sales of ``shop`` dated from ``start`` to ``end`` inclusive as column arrays, sorted by date.
+
+    Only months overlapping the range are opened. Returns None when none are archived.
+    """
+    months = ArchivedMonth.objects.filter(shop=shop, month__lte=end, month__gte=start.replace(day=1)).order_by('month')
+    parts = []
+    for archived in months:
+        columns = load_month(archived)
+        keep = (columns['date'] >= start.toordinal()) & (columns['date'] <= end.toordinal())
+        if vegetable_id is not None:
+            keep &= columns['vegetable_id'] == vegetable_id
+        parts.append({name: np.asarray(values[keep]) for name, values in columns.items()})
+
+    if not parts:
+        return None
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+def archive_month(shop, month):
+    """Move one month of ``shop``'s sales into columnar files and delete them from the table.
+
+    The files are written and verified before the rows are deleted, and the
+    ArchivedMonth record and the delete commit together. Once it exists the
+    month is read-only (see ``archived_months``).
+    """
+    start, end = month_bounds(month)
+    if ArchivedMonth.objects.filter(shop=shop, month=start).exists():
+        raise ArchiveError(f"{shop.slug} {start:%Y-%m} is already archived")
+
+    sales = VegetableSale.objects.filter(shop=shop, date__gte=start, date__lt=end)
+    rows = list(sales.order_by('date', 'vegetable_id').values(
+        'id', 'date', 'vegetable__name', 'quantity', 'purchase_price', 'selling_price', 'version',
+    ))
+    if not rows:
+        return None
+
+    relative = f'{shop.slug}/{start:%Y-%m}'
+    directory = settings.SALES_ARCHIVE_ROOT / relative
+    if directory.exists():
+        shutil.rmtree(directory)  # Left over from an earlier run that did not commit
+    checksum = _write_month(directory, shop, start, rows)
+
+    archived = ArchivedMonth(shop=shop, month=start, path=relative, row_count=len(rows), checksum=checksum)
+    verify_month(archived)
+    with transaction.atomic(using=router.db_for_write(VegetableSale)):
+        # Lock the month and compare row by row: every edit bumps a version, so any
+        # insert, delete or edit since the read shows up as a different set
+        current = set(sales.select_for_update().values_list('id', 'version'))
+        if current != {(row['id'], row['version']) for row in rows}:
+            raise ArchiveError(f"{shop.slug} {start:%Y-%m} changed while archiving; nothing was removed")
+        archived.save()
+        sales.delete()
+    return archived
+
+
+def restore_month(archived):
+    """Verify an archived month and put its rows back into VegetableSale with their original ids."""
+    verify_month(archived)
+    columns = load_month(archived)
+
+    def value(array, i):
+        return None if np.isnan(array[i]) else float(array[i])
+
+    sales = [
+        VegetableSale(
+            id=int(columns['id'][i]),
+            shop_id=archived.shop_id,
+            date=date.fromordinal(int(columns['date'][i])),
+            vegetable_id=int(columns['vegetable_id'][i]),
+            quantity=value(columns['quantity'], i),
+            purchase_price=value(columns['purchase_price'], i),
+            selling_price=value(columns['selling_price'], i),
+            version=int(columns['version'][i]),
+        )
+        for i in range(archived.row_count)
+    ]
+    start, end = month_bounds(archived.month)
+    with transaction.atomic(using=router.db_for_write(VegetableSale)):
+        # Rows created in the month after archiving (e.g. the blank defaults added
+        # when someone opens an old date) give way to the archived data if empty
+        existing = VegetableSale.objects.filter(shop_id=archived.shop_id, date__gte=start, date__lt=end)
+        if existing.exclude(quantity=None, purchase_price=None, selling_price=None).exists():
+            raise ArchiveError(f"{archived}: the month has new sales; archive them or remove them first")
+        placeholder_ids = list(existing.values_list('id', flat=True))
+        existing.delete()
+        record_changes(archived.shop_id, ChangeLogEntry.SALE, placeholder_ids, deleted=True)
+        VegetableSale.objects.bulk_create(sales)
+        record_changes(archived.shop_id, ChangeLogEntry.SALE, [sale.id for sale in sales])
+        archived.delete()
+    shutil.rmtree(_month_dir(archived))
+    return len(sales)
@@ -0,0 +1,117 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .models import VegetableSale
+
+
+class GroupCommitBatcher:
+    """Run write operations from many request threads in shared transactions.
+
+    Operations submitted within ``window`` seconds of each other (up to
+    ``max_batch``) are executed by one background thread inside a single
+    transaction, each in its own savepoint so a failing operation only rolls
+    back itself. Callers get their result only after the batch has committed,
+    and give up with TimeoutError after ``timeout`` seconds.
+    """
+
+    def __init__(self, using, window, max_batch, timeout):
+        self.using = using
+        self.window = window
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn):
+        future = Future()
+        # Carry the request's context (e.g. the active shop database) into the writer thread
+        self._queue.put((fn, contextvars.copy_context(), future))
+        self._ensure_thread()
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise TimeoutError("The write was not started in time and has been dropped") from None
+            raise TimeoutError("The write did not finish in time; it may still commit") from None
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f'group-commit-{self.using}', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            done = []
+            try:
+                with transaction.atomic(using=self.using):
+                    for fn, context, future in batch:
+                        if not future.set_running_or_notify_cancel():
+                            continue  # The caller timed out before the batch started
+                        try:
+                            with transaction.atomic(using=self.using):
+                                done.append((future, context.run(fn)))
+                        except Exception as exc:
+                            future.set_exception(exc)
+            except Exception as exc:
+                # Opening or committing the transaction failed, so none of the
+                # batch was written; fail every caller still waiting
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+            else:
+                for future, result in done:
+                    future.set_result(result)
+            finally:
+                connections[self.using].close_if_unusable_or_obsolete()
+
+
+_batchers = {}
+_batchers_lock = threading.Lock()
+
+
+def get_batcher(using):
+    with _batchers_lock:
+        if using not in _batchers:
+            _batchers[using] = GroupCommitBatcher(
+                using,
+                window=settings.SALES_GROUP_COMMIT_WINDOW_MS / 1000,
+                max_batch=settings.SALES_GROUP_COMMIT_MAX_BATCH,
+                timeout=settings.SALES_GROUP_COMMIT_TIMEOUT,
+            )
+        return _batchers[using]
+
+
+def run_write(fn, group_commit=None):
+    """Run a write operation in a transaction, shared with concurrent ones when group commit is on.
+
+    ``group_commit`` defaults to the SALES_GROUP_COMMIT setting.
+    """
+    using = router.db_for_write(VegetableSale)
+    if group_commit is None:
+        group_commit = settings.SALES_GROUP_COMMIT
+    if not group_commit:
+        with transaction.atomic(using=using):
+            return fn()
+    return get_batcher(using).submit(fn)
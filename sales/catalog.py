@@ -0,0 +1,67 @@
+import string
+from functools import partial
+
+from django.db import router, transaction
+
+from .models import Vegetable
+
+# In-process name <-> id cache, keyed by database alias because each shop
+# database carries its own catalog. Catalog rows are never renamed or reused.
+_ids_by_name = {}
+_names_by_id = {}
+
+
+def normalize_name(name):
+    """Collapse whitespace and capitalise words, so "tomato " and "Tomato" match."""
+    return string.capwords(name)
+
+
+def _remember(db, veg_id, name):
+    _ids_by_name[(db, name)] = veg_id
+    _names_by_id[(db, veg_id)] = name
+
+
+def _remember_on_commit(db, veg_id, name):
+    # A row inserted or read inside a transaction that later rolls back must not
+    # stay cached, or every writer in this process would point at a missing id
+    transaction.on_commit(partial(_remember, db, veg_id, name), using=db)
+
+
+def get_vegetable_ids(names, create=True):
+    """Map raw vegetable names to catalog ids, adding unknown names when ``create`` is set.
+
+    Names that are not in the catalog map to None when ``create`` is False.
+    """
+    db = router.db_for_write(Vegetable)
+    normalized = {name: normalize_name(name) for name in names}
+    missing = {n for n in normalized.values() if (db, n) not in _ids_by_name}
+
+    found = {}
+    if missing:
+        if create:
+            Vegetable.objects.using(db).bulk_create(
+                [Vegetable(name=n) for n in missing], ignore_conflicts=True
+            )
+        for veg_id, name in Vegetable.objects.using(db).filter(name__in=missing).values_list('id', 'name'):
+            found[name] = veg_id
+            _remember_on_commit(db, veg_id, name)
+
+    return {name: found.get(n, _ids_by_name.get((db, n))) for name, n in normalized.items()}
+
+
+def get_vegetable_id(name, create=True):
+    return get_vegetable_ids([name], create=create)[name]
+
+
+def vegetable_names(ids):
+    """Map catalog ids to vegetable names."""
+    db = router.db_for_read(Vegetable)
+    missing = {veg_id for veg_id in ids if (db, veg_id) not in _names_by_id}
+
+    found = {}
+    if missing:
+        for veg_id, name in Vegetable.objects.using(db).filter(id__in=missing).values_list('id', 'name'):
+            found[veg_id] = name
+            _remember_on_commit(db, veg_id, name)
+
+    return {veg_id: found.get(veg_id, _names_by_id.get((db, veg_id))) for veg_id in ids}
@@ -0,0 +1,23 @@
+from .models import ChangeSequence, ChangeLogEntry
+
+
+def record_changes(shop, kind, ids, deleted=False):
+    """Append rows to the shop's change feed. Must run inside the transaction making the change.
+
+    ``shop`` may be a Shop or its id.
+
+    The shop's ChangeSequence row stays locked until that transaction commits,
+    so entries become visible in sequence order and a client cursor never skips one.
+    """
+    ids = list(ids)
+    if not ids:
+        return
+    shop_id = getattr(shop, 'pk', shop)
+    counter, _ = ChangeSequence.objects.select_for_update().get_or_create(shop_id=shop_id)
+    first = counter.last_seq + 1
+    counter.last_seq += len(ids)
+    counter.save(update_fields=['last_seq'])
+    ChangeLogEntry.objects.bulk_create([
+        ChangeLogEntry(shop_id=shop_id, seq=first + offset, kind=kind, object_id=object_id, deleted=deleted)
+        for offset, object_id in enumerate(ids)
+    ])
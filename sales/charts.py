@@ -0,0 +1,166 @@
+import base64
+import re
+from contextlib import contextmanager
+from functools import wraps
+from io import BytesIO
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+from PIL import Image
+
+# Output formats accepted through ?format=. "png8" is a palette-quantized PNG,
+# which is several times smaller than a full-colour PNG for flat chart colours.
+CHART_FORMATS = {
+    'png': 'image/png',
+    'png8': 'image/png',
+    'svg': 'image/svg+xml',
+    'webp': 'image/webp',
+}
+DEFAULT_FORMAT = 'png8'
+BASE_DPI = 100
+PALETTE_COLORS = 64
+
+MIN_WIDTH, MAX_WIDTH = 200, 2400
+MIN_HEIGHT, MAX_HEIGHT = 150, 1600
+MIN_DPI, MAX_DPI = 50, 300
+MOBILE_WIDTH = 480
+
+# Browsers only send these after the server asks for them with Accept-CH
+CLIENT_HINTS = ('Sec-CH-DPR', 'Sec-CH-Viewport-Width', 'DPR', 'Viewport-Width')
+
+
+class ChartOptions:
+    """Pixel size, DPI and encoding of a rendered chart."""
+
+    def __init__(self, width, height, dpi, format):
+        self.width = width
+        self.height = height
+        self.dpi = dpi
+        self.format = format
+
+    @property
+    def figsize(self):
+        return (self.width / self.dpi, self.height / self.dpi)
+
+    @property
+    def mime(self):
+        return CHART_FORMATS[self.format]
+
+
+def _clamp(value, low, high):
+    return max(low, min(high, value))
+
+
+def _header_number(request, *names):
+    for name in names:
+        try:
+            return float(request.headers[name])
+        except (KeyError, ValueError):
+            continue
+    return None
+
+
+def _is_mobile(request):
+    if request.headers.get('Sec-CH-UA-Mobile') == '?1':
+        return True
+    return bool(re.search(r'Mobi|Android', request.headers.get('User-Agent', '')))
+
+
+def client_hints(view):
+    """Ask the browser for the hints chart_options reads on the requests that follow this page."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        response['Accept-CH'] = ', '.join(CLIENT_HINTS)
+        return response
+    return wrapper
+
+
+def chart_options(request, default_size):
+    """Build ChartOptions from ``width``, ``height``, ``dpi`` and ``format`` query params.
+
+    ``default_size`` is the chart's natural ``(width, height)`` in pixels at 100 DPI.
+    Missing values are derived from the client: phones and narrow viewports get a
+    narrower chart of the same aspect ratio, and high-density screens get
+    proportionally more pixels and DPI so the text keeps its size. The pages
+    that load charts are wrapped in ``client_hints`` so those headers arrive.
+    """
+    default_width, default_height = default_size
+    params = request.GET
+
+    css_width = default_width
+    viewport = _header_number(request, 'Sec-CH-Viewport-Width', 'Viewport-Width')
+    if viewport:
+        css_width = min(css_width, viewport)
+    if _is_mobile(request):
+        css_width = min(css_width, MOBILE_WIDTH)
+    dpr = _clamp(_header_number(request, 'Sec-CH-DPR', 'DPR') or 1, 1, 3)
+
+    try:
+        width = int(params.get('width') or css_width * dpr)
+        height = int(params.get('height') or width * default_height / default_width)
+        dpi = int(params.get('dpi') or BASE_DPI * dpr)
+    except ValueError:
+        width = int(css_width * dpr)
+        height = int(width * default_height / default_width)
+        dpi = int(BASE_DPI * dpr)
+
+    fmt = params.get('format', '').lower()
+    if fmt not in CHART_FORMATS:
+        fmt = DEFAULT_FORMAT
+
+    return ChartOptions(
+        width=_clamp(width, MIN_WIDTH, MAX_WIDTH),
+        height=_clamp(height, MIN_HEIGHT, MAX_HEIGHT),
+        dpi=_clamp(dpi, MIN_DPI, MAX_DPI),
+        format=fmt,
+    )
+
+
+@contextmanager
+def chart_figure(options):
+    """Create a figure and axes sized by ``options``; the figure is always closed on exit.
+
+    Long-lived workers would otherwise keep every figure whose view raised
+    between creating and closing it.
+    """
+    fig, ax = plt.subplots(figsize=options.figsize, dpi=options.dpi)
+    try:
+        yield fig, ax
+    finally:
+        plt.close(fig)
+
+
+def open_figure_count():
+    """Number of figures pyplot is holding in this process; should be 0 between requests."""
+    return len(plt.get_fignums())
+
+
+def encode_figure(fig, options):
+    """Render ``fig`` in the requested format and return the encoded bytes."""
+    buffer = BytesIO()
+    try:
+        if options.format in ('png', 'svg'):
+            fig.savefig(buffer, format=options.format, dpi=options.dpi)
+        else:
+            # Rasterise once with Agg and let Pillow do the compact encoding
+            fig.canvas.draw()
+            image = Image.fromarray(np.asarray(fig.canvas.buffer_rgba())).convert('RGB')
+            if options.format == 'png8':
+                image = image.quantize(colors=PALETTE_COLORS, method=Image.Quantize.FASTOCTREE)
+                image.save(buffer, format='PNG', optimize=True)
+            else:
+                image.save(buffer, format='WEBP', lossless=True, method=4)
+        return buffer.getvalue()
+    finally:
+        buffer.close()
+
+
+def encode_figure_base64(fig, options):
+    return base64.b64encode(encode_figure(fig, options)).decode('utf-8')
+
+
+def figure_data_url(fig, options):
+    return f'data:{options.mime};base64,{encode_figure_base64(fig, options)}'
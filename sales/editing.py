@@ -0,0 +1,61 @@
+from django.db import router, transaction
+from django.db.models import F
+
+from .archive import archived_months
+from .changes import record_changes
+from .forecasting import update_forecasts
+from .models import ChangeLogEntry, VegetableSale
+
+EDITABLE_FIELDS = ('quantity', 'purchase_price', 'selling_price')
+
+
+def apply_sale_edits(shop, edits, selected_date=None):
+    """Apply edits to VegetableSale rows with optimistic concurrency.
+
+    Each edit is a dict with an ``id``, the ``version`` the client last saw and
+    any of the editable fields. A row is only written if its version still
+    matches, so concurrent clerks never silently overwrite each other. A
+    ``None`` version (a client that never saw the row) is always a conflict.
+
+    Returns ``(saved, conflicts)``: the new ``{id, version}`` of every written row,
+    and the current state of every row that was changed or deleted meanwhile.
+    Rows in archived months are read-only and come back as ``{id, archived}``.
+    """
+    saved_ids = []
+    conflict_ids = []
+    archived_ids = []
+
+    with transaction.atomic(using=router.db_for_write(VegetableSale)):
+        row_ids = [int(edit['id']) for edit in edits]
+        days = dict(VegetableSale.objects.filter(id__in=row_ids, shop=shop).values_list('id', 'date'))
+        frozen = archived_months(shop, days.values())
+
+        for edit in edits:
+            row_id = int(edit['id'])
+            if row_id in days and days[row_id].replace(day=1) in frozen:
+                archived_ids.append(row_id)
+                continue
+            rows = VegetableSale.objects.filter(id=row_id, shop=shop)
+            if selected_date is not None:
+                rows = rows.filter(date=selected_date)
+            rows = rows.filter(version=edit['version'])
+
+            values = {field: edit[field] for field in EDITABLE_FIELDS if field in edit}
+            if rows.update(version=F('version') + 1, **values):
+                saved_ids.append(row_id)
+            else:
+                conflict_ids.append(row_id)
+
+        record_changes(shop, ChangeLogEntry.SALE, saved_ids)
+        update_forecasts(shop, saved_ids)
+
+    current = {
+        row['id']: row
+        for row in VegetableSale.objects.filter(id__in=saved_ids + conflict_ids, shop=shop).values(
+            'id', 'version', *EDITABLE_FIELDS
+        )
+    }
+    saved = [{'id': row_id, 'version': current[row_id]['version']} for row_id in saved_ids]
+    conflicts = [current.get(row_id, {'id': row_id, 'deleted': True}) for row_id in conflict_ids]
+    conflicts += [{'id': row_id, 'archived': True} for row_id in archived_ids]
+    return saved, conflicts
@@ -0,0 +1,188 @@
+import math
+
+import numpy as np
+from django.db import router, transaction
+
+from .models import VegetableForecast, VegetableSale
+
+# Weight of the newest day in the exponentially weighted statistics
+ALPHA = 0.3
+# Extra stock, in standard deviations of daily quantity, for vegetables sold at a profit
+SAFETY_Z = 1.0
+
+STAT_FIELDS = ('quantity_mean', 'quantity_var', 'margin_mean', 'loss_mean')
+
+
+def suggest_quantity(quantity_mean, quantity_var, margin_mean):
+    """Quantity to buy for the next day; only profitable vegetables get a safety buffer."""
+    buffer = SAFETY_Z * math.sqrt(max(quantity_var, 0.0)) if margin_mean > 0 else 0.0
+    return round(max(quantity_mean + buffer, 0.0), 2)
+
+
+def _observation(quantity, purchase_price, selling_price):
+    margin = selling_price - purchase_price
+    return quantity, margin, max(-margin, 0.0) * quantity
+
+
+def _fold(state, quantity, margin, loss):
+    """One exponentially weighted step; ``state`` is None before the first day."""
+    if state is None:
+        return {'quantity_mean': quantity, 'quantity_var': 0.0, 'margin_mean': margin, 'loss_mean': loss}
+
+    diff = quantity - state['quantity_mean']
+    increment = ALPHA * diff
+    return {
+        'quantity_mean': state['quantity_mean'] + increment,
+        'quantity_var': (1 - ALPHA) * (state['quantity_var'] + diff * increment),
+        'margin_mean': state['margin_mean'] + ALPHA * (margin - state['margin_mean']),
+        'loss_mean': state['loss_mean'] + ALPHA * (loss - state['loss_mean']),
+    }
+
+
+def update_forecasts(shop, sale_ids):
+    """Fold freshly saved sales rows into their vegetables' statistics in O(1) each.
+
+    A new latest day advances the statistics and re-saving the latest day replaces
+    its contribution. A vegetable with an edit to an older day, or whose latest
+    day was blanked, is rebuilt from its history with ``backfill_forecasts``.
+    Must run inside the transaction that saved the rows.
+    """
+    rows_by_vegetable = {}
+    for row in VegetableSale.objects.filter(shop=shop, id__in=sale_ids).order_by('date').values_list(
+        'vegetable_id', 'date', 'quantity', 'purchase_price', 'selling_price'
+    ):
+        rows_by_vegetable.setdefault(row[0], []).append(row[1:])
+
+    rebuild = []
+    for vegetable_id, rows in rows_by_vegetable.items():
+        forecast = VegetableForecast.objects.select_for_update().filter(shop=shop, vegetable_id=vegetable_id).first()
+        if forecast is not None and any(
+            day < forecast.last_date or (day == forecast.last_date and None in values)
+            for day, *values in rows
+        ):
+            rebuild.append(vegetable_id)
+            continue
+
+        for day, *values in rows:
+            if None in values:
+                continue
+            if forecast is None:
+                forecast = VegetableForecast(shop=shop, vegetable_id=vegetable_id, observations=1)
+                previous = None
+            elif day > forecast.last_date:
+                previous = {field: getattr(forecast, field) for field in STAT_FIELDS}
+                forecast.observations += 1
+            else:
+                previous = None if forecast.prev_quantity_mean is None else {
+                    field: getattr(forecast, f'prev_{field}') for field in STAT_FIELDS
+                }
+
+            _store(forecast, day, previous, _fold(previous, *_observation(*values)))
+            forecast.save()
+
+    if rebuild:
+        backfill_forecasts(shop, rebuild)
+
+
+def forget_sales(shop, deleted):
+    """Drop deleted sales rows, given as ``(vegetable_id, date)`` pairs, from the forecasts.
+
+    A forecast only changes if a deleted day is on or before its latest day; those
+    vegetables are rebuilt from what is left. Must run inside the deleting transaction.
+    """
+    days = {}
+    for vegetable_id, day in deleted:
+        days[vegetable_id] = min(day, days.get(vegetable_id, day))
+    if not days:
+        return
+
+    rebuild = [
+        vegetable_id
+        for vegetable_id, last_date in VegetableForecast.objects.filter(
+            shop=shop, vegetable_id__in=days
+        ).values_list('vegetable_id', 'last_date')
+        if days[vegetable_id] <= last_date
+    ]
+    if rebuild:
+        backfill_forecasts(shop, rebuild)
+
+
+def _store(forecast, day, previous, state):
+    forecast.last_date = day
+    for field in STAT_FIELDS:
+        setattr(forecast, field, state[field])
+        setattr(forecast, f'prev_{field}', None if previous is None else previous[field])
+    forecast.suggested_quantity = suggest_quantity(state['quantity_mean'], state['quantity_var'], state['margin_mean'])
+
+
+def _weighted_sums(values, weights, starts):
+    return np.add.reduceat(values * weights, starts)
+
+
+def backfill_forecasts(shop, vegetable_ids=None):
+    """Rebuild the forecasts of ``shop`` from its full sales history in one vectorized pass.
+
+    Only the given vegetables are rebuilt when ``vegetable_ids`` is passed.
+
+    The recursive update unrolls to fixed weights: a day ``k`` days before the
+    latest weighs ``ALPHA * (1 - ALPHA) ** k`` and the first day takes the
+    remaining ``(1 - ALPHA) ** k``. The variance is the weighted mean of squares
+    minus the squared mean, which matches the incremental update exactly.
+    """
+    sales = VegetableSale.objects.filter(
+        shop=shop, quantity__isnull=False, purchase_price__isnull=False, selling_price__isnull=False,
+    )
+    forecasts = VegetableForecast.objects.filter(shop=shop)
+    if vegetable_ids is not None:
+        sales = sales.filter(vegetable_id__in=vegetable_ids)
+        forecasts = forecasts.filter(vegetable_id__in=vegetable_ids)
+    rows = list(
+        sales.order_by('vegetable_id', 'date').values_list('vegetable_id', 'date', 'quantity', 'purchase_price', 'selling_price')
+    )
+
+    rebuilt = []
+    if rows:
+        vegetable_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        values = np.array([row[2:] for row in rows], dtype=np.float64)
+        quantity = values[:, 0]
+        margin = values[:, 2] - values[:, 1]
+        loss = np.maximum(-margin, 0.0) * quantity
+
+        starts = np.flatnonzero(np.r_[True, vegetable_ids[1:] != vegetable_ids[:-1]])
+        lengths = np.diff(np.r_[starts, len(rows)])
+        group = np.repeat(np.arange(len(starts)), lengths)
+        age = lengths[group] - 1 - (np.arange(len(rows)) - starts[group])  # Days before the group's latest
+        is_first = np.zeros(len(rows), dtype=bool)
+        is_first[starts] = True
+        is_last = age == 0
+
+        def statistics(age, include):
+            weights = np.where(is_first, (1 - ALPHA) ** age, ALPHA * (1 - ALPHA) ** age)
+            weights = np.where(include, weights, 0.0)
+            quantity_mean = _weighted_sums(quantity, weights, starts)
+            quantity_var = np.maximum(_weighted_sums(quantity ** 2, weights, starts) - quantity_mean ** 2, 0.0)
+            return {
+                'quantity_mean': quantity_mean,
+                'quantity_var': quantity_var,
+                'margin_mean': _weighted_sums(margin, weights, starts),
+                'loss_mean': _weighted_sums(loss, weights, starts),
+            }
+
+        current = statistics(age, np.ones(len(rows), dtype=bool))
+        # The same statistics one day earlier, for replacing the latest day on re-save
+        before_last = statistics(np.maximum(age - 1, 0), ~is_last)
+
+        for i, start in enumerate(starts):
+            last = start + lengths[i] - 1
+            forecast = VegetableForecast(
+                shop=shop, vegetable_id=int(vegetable_ids[start]), observations=int(lengths[i]),
+            )
+            state = {field: float(current[field][i]) for field in STAT_FIELDS}
+            previous = None if lengths[i] == 1 else {field: float(before_last[field][i]) for field in STAT_FIELDS}
+            _store(forecast, rows[last][1], previous, state)
+            rebuilt.append(forecast)
+
+    with transaction.atomic(using=router.db_for_write(VegetableForecast)):
+        forecasts.delete()
+        VegetableForecast.objects.bulk_create(rebuilt)
+    return rebuilt
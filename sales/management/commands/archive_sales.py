@@ -0,0 +1,74 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import shops
+from sales.archive import ArchiveError, archive_month, verify_month
+from sales.models import ArchivedMonth, Shop, VegetableSale
+
+
+def parse_month(value):
+    try:
+        year, month = map(int, value.split('-'))
+        return date(year, month, 1)
+    except ValueError:
+        raise CommandError(f"Invalid month '{value}', expected YYYY-MM")
+
+
+class Command(BaseCommand):
+    help = "Move closed months of sales into memory-mapped columnar files and out of the sales table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', help="Shop slug; all shops when omitted.")
+        parser.add_argument(
+            '--before', type=parse_month,
+            help="Archive months before this one (YYYY-MM). By default the last three closed months stay in the table.",
+        )
+        parser.add_argument('--verify', action='store_true', help="Only check the checksums of archived months.")
+
+    def handle(self, *args, **options):
+        shop_list = Shop.objects.all()
+        if options['shop']:
+            shop_list = shop_list.filter(slug=options['shop'])
+            if not shop_list.exists():
+                raise CommandError(f"Unknown shop '{options['shop']}'")
+
+        current = date.today().replace(day=1)
+        # Three months before the current one
+        default = date(current.year - (current.month <= 3), (current.month - 4) % 12 + 1, 1)
+        before = options['before'] or default
+        if before > current:
+            raise CommandError("Only closed months can be archived; --before must not be after the current month")
+
+        for shop in shop_list:
+            token = shops.activate(shop)
+            try:
+                if options['verify']:
+                    self._verify(shop)
+                else:
+                    self._archive(shop, before)
+            finally:
+                shops.deactivate(token)
+
+    def _archive(self, shop, before):
+        days = VegetableSale.objects.filter(shop=shop, date__lt=before).dates('date', 'month')
+        for month in days:
+            try:
+                archived = archive_month(shop, month)
+            except ArchiveError as error:
+                self.stderr.write(str(error))
+                continue
+            if archived is not None:
+                self.stdout.write(f"{shop.slug} {month:%Y-%m}: {archived.row_count} row(s) archived")
+
+    def _verify(self, shop):
+        failed = 0
+        for archived in ArchivedMonth.objects.filter(shop=shop).order_by('month'):
+            try:
+                verify_month(archived)
+            except (ArchiveError, OSError) as error:
+                failed += 1
+                self.stderr.write(str(error))
+        if failed:
+            raise CommandError(f"{shop.slug}: {failed} archived month(s) failed verification")
+        self.stdout.write(f"{shop.slug}: archived months verified")
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import shops
+from sales.forecasting import backfill_forecasts
+from sales.models import Shop
+
+
+class Command(BaseCommand):
+    help = "Rebuild reorder forecasts from the full sales history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shop', help="Shop slug; all shops when omitted.")
+
+    def handle(self, *args, **options):
+        shop_list = Shop.objects.all()
+        if options['shop']:
+            shop_list = shop_list.filter(slug=options['shop'])
+            if not shop_list.exists():
+                raise CommandError(f"Unknown shop '{options['shop']}'")
+
+        for shop in shop_list:
+            token = shops.activate(shop)
+            try:
+                forecasts = backfill_forecasts(shop)
+            finally:
+                shops.deactivate(token)
+            self.stdout.write(f"{shop.slug}: {len(forecasts)} vegetable forecast(s) rebuilt")
@@ -0,0 +1,77 @@
+import threading
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from sales import catalog
+from sales.batching import run_write
+from sales.editing import apply_sale_edits
+from sales.models import Shop, Vegetable, VegetableSale
+
+BENCH_SHOP_SLUG = 'write-benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure sales write throughput with N concurrent clerks, with and without group commit. "
+        "Run it against the target database before enabling SALES_GROUP_COMMIT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clerks', type=int, default=8)
+        parser.add_argument('--ops', type=int, default=200, help="Edits per clerk.")
+
+    def handle(self, *args, **options):
+        database = connection.vendor
+        if database == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous')
+                database += f" (synchronous={('OFF', 'NORMAL', 'FULL', 'EXTRA')[cursor.fetchone()[0]]})"
+        self.stdout.write(f"Database: {database}, {options['clerks']} clerks x {options['ops']} edits")
+        shop = Shop.objects.create(name='Write benchmark', slug=BENCH_SHOP_SLUG)
+        names = [f'Benchmark Vegetable {i}' for i in range(options['clerks'])]
+        try:
+            vegetable_ids = catalog.get_vegetable_ids(names)
+            rows = VegetableSale.objects.bulk_create(
+                [VegetableSale(shop=shop, vegetable_id=vegetable_ids[name], date=date.today()) for name in names]
+            )
+            row_ids = [row.id for row in VegetableSale.objects.filter(shop=shop).order_by('id')]
+            for group_commit in (False, True):
+                elapsed = self._run(shop, row_ids, options['ops'], group_commit)
+                total = len(rows) * options['ops']
+                label = "group commit" if group_commit else "per-request transactions"
+                self.stdout.write(f"{label:>26}: {total / elapsed:8.1f} edits/s ({elapsed:.2f}s)")
+        finally:
+            VegetableSale.objects.filter(shop=shop).delete()
+            Vegetable.objects.filter(name__in=names).delete()
+            shop.delete()
+
+    def _run(self, shop, row_ids, ops, group_commit):
+        errors = []
+
+        def clerk(row_id):
+            try:
+                # Each clerk owns its row, so carrying the returned version never conflicts
+                version = VegetableSale.objects.get(id=row_id).version
+                for i in range(ops):
+                    edit = {'id': row_id, 'version': version, 'quantity': float(i), 'purchase_price': 10.0, 'selling_price': 12.0}
+                    saved, _ = run_write(lambda: apply_sale_edits(shop, [edit]), group_commit=group_commit)
+                    version = saved[0]['version']
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=clerk, args=(row_id,)) for row_id in row_ids]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        if errors:
+            self.stderr.write(f"{len(errors)} clerk(s) failed, first error: {errors[0]!r}")
+        return elapsed
@@ -0,0 +1,57 @@
+import gc
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from sales.charts import CHART_FORMATS, ChartOptions, chart_figure, encode_figure, open_figure_count
+from sales.watchdog import current_rss_bytes
+
+
+class Command(BaseCommand):
+    help = "Render charts repeatedly and fail if open figures or resident memory keep growing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--renders', type=int, default=10000)
+        parser.add_argument('--warmup', type=int, default=200, help="Renders before the baseline is taken.")
+        parser.add_argument('--max-growth-mb', type=float, default=20.0)
+        parser.add_argument('--fail-every', type=int, default=10,
+                            help="Raise inside every Nth render to check figures are released on errors.")
+
+    def handle(self, *args, **options):
+        labels = ['Onion', 'Tomato', 'Potato', 'Carrot', 'Brinjal', 'Beans', 'Cabbage', 'Okra']
+        formats = list(CHART_FORMATS)
+        rng = np.random.default_rng(0)
+        baseline = None
+
+        for i in range(options['warmup'] + options['renders']):
+            if i == options['warmup']:
+                gc.collect()
+                baseline = current_rss_bytes()
+
+            chart = ChartOptions(width=640, height=320, dpi=100, format=formats[i % len(formats)])
+            try:
+                with chart_figure(chart) as (fig, ax):
+                    ax.bar(labels, rng.random(len(labels)) * 50, color='lightgreen')
+                    ax.set_title(f'Soak render {i}')
+                    if options['fail_every'] and i % options['fail_every'] == 0:
+                        raise ValueError("simulated failure while drawing")
+                    encode_figure(fig, chart)
+            except ValueError:
+                pass
+
+            if open_figure_count():
+                raise CommandError(f"{open_figure_count()} figure(s) left open after render {i}")
+
+        gc.collect()
+        final = current_rss_bytes()
+        if baseline is None or final is None:
+            self.stdout.write(f"Rendered {options['renders']} charts; RSS not available on this platform.")
+            return
+
+        growth_mb = (final - baseline) / 1024 / 1024
+        self.stdout.write(
+            f"Rendered {options['renders']} charts: RSS {baseline / 1024 / 1024:.1f} MB -> "
+            f"{final / 1024 / 1024:.1f} MB ({growth_mb:+.1f} MB), open figures {open_figure_count()}"
+        )
+        if growth_mb > options['max_growth_mb']:
+            raise CommandError(f"RSS grew by {growth_mb:.1f} MB, above the {options['max_growth_mb']} MB limit")
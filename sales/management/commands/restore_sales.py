@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from sales import shops
+from sales.archive import ArchiveError, restore_month
+from sales.models import ArchivedMonth, Shop
+
+from .archive_sales import parse_month
+
+
+class Command(BaseCommand):
+    help = "Verify an archived month of sales and move it back into the sales table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('month', type=parse_month, help="Month to restore (YYYY-MM).")
+        parser.add_argument('--shop', default=shops.DEFAULT_SHOP_SLUG, help="Shop slug.")
+
+    def handle(self, *args, **options):
+        shop = Shop.objects.filter(slug=options['shop']).first()
+        if shop is None:
+            raise CommandError(f"Unknown shop '{options['shop']}'")
+
+        token = shops.activate(shop)
+        try:
+            archived = ArchivedMonth.objects.filter(shop=shop, month=options['month']).first()
+            if archived is None:
+                raise CommandError(f"{shop.slug} {options['month']:%Y-%m} is not archived")
+            try:
+                restored = restore_month(archived)
+            except ArchiveError as error:
+                raise CommandError(str(error))
+        finally:
+            shops.deactivate(token)
+        self.stdout.write(f"{shop.slug} {options['month']:%Y-%m}: {restored} row(s) restored")
@@ -0,0 +1,32 @@
+from django.contrib.auth.views import redirect_to_login
+from django.http import JsonResponse
+
+from . import shops
+
+
+class ShopMiddleware:
+    """Attach the current shop to the request and route its queries to the shop's database.
+
+    Views of the sales app are refused to users who are not bound to a shop:
+    anonymous visitors are sent to the login page, others get a 403.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.shop = shops.resolve_shop(request)
+        if request.shop is None:
+            return self.get_response(request)
+        token = shops.activate(request.shop)
+        try:
+            return self.get_response(request)
+        finally:
+            shops.deactivate(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.shop is not None or view_func.__module__ != 'sales.views':
+            return None
+        if not request.user.is_authenticated:
+            return redirect_to_login(request.get_full_path())
+        return JsonResponse({"success": False, "message": "Your account is not assigned to a shop."}, status=403)
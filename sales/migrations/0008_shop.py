@@ -0,0 +1,102 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def assign_default_shop(apps, schema_editor):
+    """Move every existing row into a 'default' shop."""
+    Shop = apps.get_model('sales', 'Shop')
+    db_alias = schema_editor.connection.alias
+    shop, _ = Shop.objects.using(db_alias).get_or_create(slug='default', defaults={'name': 'SLV Vegetables'})
+    for model_name in ('VegetableSale', 'DailySummary', 'VegetableReport', 'ReportSummary'):
+        model = apps.get_model('sales', model_name)
+        model.objects.using(db_alias).filter(shop__isnull=True).update(shop=shop)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0007_reportsummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Shop',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('slug', models.SlugField(unique=True)),
+                ('database', models.CharField(default='default', max_length=50)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vegetablesale',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.AddField(
+            model_name='dailysummary',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.AddField(
+            model_name='vegetablereport',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.AddField(
+            model_name='reportsummary',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.RunPython(assign_default_shop, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='vegetablesale',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.AlterField(
+            model_name='dailysummary',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.AlterField(
+            model_name='vegetablereport',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.AlterField(
+            model_name='reportsummary',
+            name='shop',
+            field=models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.shop'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vegetablesale',
+            unique_together={('shop', 'vegetable', 'date')},
+        ),
+        migrations.AddIndex(
+            model_name='vegetablesale',
+            index=models.Index(fields=['shop', 'date'], name='sales_shop_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='dailysummary',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='dailysummary',
+            unique_together={('shop', 'date')},
+        ),
+        migrations.AddIndex(
+            model_name='vegetablereport',
+            index=models.Index(fields=['shop', 'date'], name='report_shop_date_idx'),
+        ),
+        migrations.AlterField(
+            model_name='reportsummary',
+            name='date',
+            field=models.DateField(),
+        ),
+        migrations.AlterUniqueTogether(
+            name='reportsummary',
+            unique_together={('shop', 'date')},
+        ),
+    ]
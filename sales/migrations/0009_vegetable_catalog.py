@@ -0,0 +1,158 @@
+import string
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Amounts that add up when split entries for one day are merged
+ADDITIVE_FIELDS = ['quantity', 'total_purchase_price', 'total_selling_price', 'profit', 'loss']
+# Unit prices, averaged by quantity so quantity * price still adds up
+PRICE_FIELDS = ['purchase_price', 'selling_price']
+
+
+def merged_price(sales, field):
+    """Quantity-weighted average of ``field``; the newest non-blank price if no row has both."""
+    priced = [(sale.quantity, getattr(sale, field)) for sale in sales
+              if sale.quantity and getattr(sale, field) is not None]
+    weight = sum(quantity for quantity, _ in priced)
+    if weight:
+        return sum(quantity * price for quantity, price in priced) / weight
+    return next((getattr(sale, field) for sale in sales if getattr(sale, field) is not None), None)
+
+
+def link_vegetable_catalog(apps, schema_editor):
+    """Build the catalog from the free-text names and point every row at it.
+
+    Sales rows whose names only differ in case or spacing collapse into one
+    row per (shop, vegetable, date). The newest row is kept, the amounts of
+    the others are added to it and its unit prices become the quantity-weighted
+    averages, so the day's purchase and selling values are unchanged; rows with
+    nothing filled in are simply dropped.
+    """
+    Vegetable = apps.get_model('sales', 'Vegetable')
+    VegetableSale = apps.get_model('sales', 'VegetableSale')
+    VegetableReport = apps.get_model('sales', 'VegetableReport')
+    db_alias = schema_editor.connection.alias
+
+    raw_names = set(VegetableSale.objects.using(db_alias).values_list('vegetable', flat=True))
+    raw_names |= set(VegetableReport.objects.using(db_alias).values_list('vegetable', flat=True))
+
+    catalog = {}
+    for raw_name in raw_names:
+        vegetable, _ = Vegetable.objects.using(db_alias).get_or_create(name=string.capwords(raw_name))
+        catalog[raw_name] = vegetable.id
+
+    groups = {}
+    for sale_id, shop_id, raw_name, day in VegetableSale.objects.using(db_alias).values_list(
+        'id', 'shop_id', 'vegetable', 'date'
+    ):
+        groups.setdefault((shop_id, catalog[raw_name], day), []).append(sale_id)
+
+    duplicate_ids = [sale_id for ids in groups.values() if len(ids) > 1 for sale_id in ids]
+    rows = VegetableSale.objects.using(db_alias).in_bulk(duplicate_ids)
+    removed = []
+    for ids in groups.values():
+        if len(ids) < 2:
+            continue
+        merged = sorted((rows[sale_id] for sale_id in ids), key=lambda sale: -sale.id)
+        kept, *others = merged
+        prices = {field: merged_price(merged, field) for field in PRICE_FIELDS}
+        for sale in others:
+            removed.append(sale.id)
+            for field in ADDITIVE_FIELDS:
+                value = getattr(sale, field)
+                if value is not None:
+                    setattr(kept, field, (getattr(kept, field) or 0) + value)
+        for field, price in prices.items():
+            setattr(kept, field, price)
+        kept.save(update_fields=ADDITIVE_FIELDS + PRICE_FIELDS)
+    VegetableSale.objects.using(db_alias).filter(id__in=removed).delete()
+
+    for raw_name, veg_id in catalog.items():
+        VegetableSale.objects.using(db_alias).filter(vegetable=raw_name).update(vegetable_item_id=veg_id)
+        VegetableReport.objects.using(db_alias).filter(vegetable=raw_name).update(vegetable_item_id=veg_id)
+
+
+def unlink_vegetable_catalog(apps, schema_editor):
+    VegetableSale = apps.get_model('sales', 'VegetableSale')
+    VegetableReport = apps.get_model('sales', 'VegetableReport')
+    db_alias = schema_editor.connection.alias
+
+    for model in (VegetableSale, VegetableReport):
+        for row in model.objects.using(db_alias).select_related('vegetable_item'):
+            row.vegetable = row.vegetable_item.name
+            row.save(update_fields=['vegetable'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0008_shop'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vegetable',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='vegetablesale',
+            name='vegetable_item',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='sales.vegetable'),
+        ),
+        migrations.AddField(
+            model_name='vegetablereport',
+            name='vegetable_item',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, to='sales.vegetable'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vegetablesale',
+            unique_together=set(),
+        ),
+        migrations.RunPython(link_vegetable_catalog, unlink_vegetable_catalog),
+        # Defaults let the free-text columns be re-added when migrating backwards
+        migrations.AlterField(
+            model_name='vegetablesale',
+            name='vegetable',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='vegetablereport',
+            name='vegetable',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RemoveField(
+            model_name='vegetablesale',
+            name='vegetable',
+        ),
+        migrations.RemoveField(
+            model_name='vegetablereport',
+            name='vegetable',
+        ),
+        migrations.RenameField(
+            model_name='vegetablesale',
+            old_name='vegetable_item',
+            new_name='vegetable',
+        ),
+        migrations.RenameField(
+            model_name='vegetablereport',
+            old_name='vegetable_item',
+            new_name='vegetable',
+        ),
+        migrations.AlterField(
+            model_name='vegetablesale',
+            name='vegetable',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='sales.vegetable'),
+        ),
+        migrations.AlterField(
+            model_name='vegetablereport',
+            name='vegetable',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='sales.vegetable'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='vegetablesale',
+            unique_together={('shop', 'vegetable', 'date')},
+        ),
+    ]
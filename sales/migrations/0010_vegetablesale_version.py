@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0009_vegetable_catalog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='vegetablesale',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0010_vegetablesale_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='vegetablereport',
+            index=models.Index(fields=['date', 'id'], name='report_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vegetablesale',
+            index=models.Index(fields=['date', 'id'], name='sales_date_id_idx'),
+        ),
+    ]
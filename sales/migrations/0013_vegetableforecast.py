@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-19 10:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0012_sync_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VegetableForecast',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_date', models.DateField()),
+                ('observations', models.PositiveIntegerField(default=0)),
+                ('quantity_mean', models.FloatField()),
+                ('quantity_var', models.FloatField()),
+                ('margin_mean', models.FloatField()),
+                ('loss_mean', models.FloatField()),
+                ('suggested_quantity', models.FloatField()),
+                ('prev_quantity_mean', models.FloatField(null=True)),
+                ('prev_quantity_var', models.FloatField(null=True)),
+                ('prev_margin_mean', models.FloatField(null=True)),
+                ('prev_loss_mean', models.FloatField(null=True)),
+                ('shop', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.CASCADE, to='sales.shop')),
+                ('vegetable', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='sales.vegetable')),
+            ],
+            options={
+                'unique_together': {('shop', 'vegetable')},
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0014_archivedmonth'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShopMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shop', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='sales.shop')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='shop_membership', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('sales', '0015_shopmembership'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dailysummary',
+            index=models.Index(fields=['date', 'id'], name='daily_summary_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reportsummary',
+            index=models.Index(fields=['date', 'id'], name='report_summary_date_id_idx'),
+        ),
+    ]
@@ -1,9 +1,43 @@
+from django.conf import settings
 from django.db import models
 from datetime import date
 
+
+class Shop(models.Model):
+    """A vendor served by this deployment. Every sales row belongs to one shop."""
+    name = models.CharField(max_length=100)
+    slug = models.SlugField(max_length=50, unique=True)
+    # Database alias holding this shop's sales data (see sales.routers.ShopRouter)
+    database = models.CharField(max_length=50, default='default')
+
+    def __str__(self):
+        return self.name
+
+
+class ShopMembership(models.Model):
+    """Binds a clerk's or device's user account to the shop it works for."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='shop_membership')
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name='memberships')
+
+    def __str__(self):
+        return f"{self.user} @ {self.shop}"
+
+
+class Vegetable(models.Model):
+    """Catalog entry for a vegetable. Names are stored normalized (see sales.catalog)."""
+    name = models.CharField(max_length=100, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class VegetableSale(models.Model):
+    # The shop registry lives on the default database while a shop's rows may be
+    # placed elsewhere by the router, so the relation is not enforced in SQL.
+    # The composite constraints below lead with the shop, so no separate index.
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
     date = models.DateField(default=date.today)  # Default to today's date
-    vegetable = models.CharField(max_length=100)
+    vegetable = models.ForeignKey(Vegetable, on_delete=models.PROTECT)
     quantity = models.FloatField(null=True, blank=True)
     purchase_price = models.FloatField(null=True, blank=True)
     selling_price = models.FloatField(null=True, blank=True)
@@ -13,27 +47,40 @@ class VegetableSale(models.Model):
     total_selling_price = models.FloatField(null=True, blank=True)
     profit = models.FloatField(null=True, blank=True)
     loss = models.FloatField(null=True, blank=True)
+    # Bumped on every edit; writers compare-and-swap against it (see sales.editing)
+    version = models.PositiveIntegerField(default=1)
 
     class Meta:
-        unique_together = ('vegetable', 'date')  # Ensures uniqueness for vegetable + date
+        unique_together = ('shop', 'vegetable', 'date')  # Ensures uniqueness for vegetable + date within a shop
+        indexes = [
+            models.Index(fields=['shop', 'date'], name='sales_shop_date_idx'),
+            # Cross-shop admin browsing: date hierarchy and (-date, -id) ordering
+            models.Index(fields=['date', 'id'], name='sales_date_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.vegetable} - {self.date}"
 
 
 class DailySummary(models.Model):
-    date = models.DateField(unique=True)  # Only one summary per date
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    date = models.DateField()
     total_purchase_price = models.FloatField(default=0.0)
     total_selling_price = models.FloatField(default=0.0)
     total_profit = models.FloatField(default=0.0)
     total_loss = models.FloatField(default=0.0)
 
+    class Meta:
+        unique_together = ('shop', 'date')  # Only one summary per date within a shop
+        indexes = [models.Index(fields=['date', 'id'], name='daily_summary_date_id_idx')]
+
     def __str__(self):
         return f"Summary for {self.date}"
     
 class VegetableReport(models.Model):
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
     date = models.DateField()
-    vegetable = models.CharField(max_length=50)
+    vegetable = models.ForeignKey(Vegetable, on_delete=models.PROTECT)
     quantity = models.FloatField()
     purchase_price = models.FloatField()
     selling_price = models.FloatField()
@@ -42,17 +89,112 @@ class VegetableReport(models.Model):
     profit = models.FloatField()
     loss = models.FloatField()
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['shop', 'date'], name='report_shop_date_idx'),
+            models.Index(fields=['date', 'id'], name='report_date_id_idx'),
+        ]
+
     def __str__(self):
         return f"{self.vegetable} - {self.date}"
     
 
 class ReportSummary(models.Model):
-    date = models.DateField(unique=True)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    date = models.DateField()
     total_purchase = models.FloatField(default=0)
     total_selling = models.FloatField(default=0)
     profit = models.FloatField(default=0)
     loss = models.FloatField(default=0)
 
+    class Meta:
+        unique_together = ('shop', 'date')
+        indexes = [models.Index(fields=['date', 'id'], name='report_summary_date_id_idx')]
+
     def __str__(self):
         return f"Summary for {self.date}"
     
+
+
+class ChangeSequence(models.Model):
+    """Per-shop counter for the change feed. Its row lock orders concurrent writers."""
+    shop = models.OneToOneField(Shop, on_delete=models.CASCADE, db_constraint=False)
+    last_seq = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.shop_id} @ {self.last_seq}"
+
+
+class ChangeLogEntry(models.Model):
+    """A change to a synced row, numbered by a sequence that only grows within a shop."""
+    SALE = 'sale'
+    SUMMARY = 'summary'
+    KIND_CHOICES = [(SALE, 'Vegetable sale'), (SUMMARY, 'Daily summary')]
+
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    seq = models.BigIntegerField()
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('shop', 'seq')
+
+    def __str__(self):
+        return f"#{self.seq} {self.kind} {self.object_id}"
+
+
+class SyncOperation(models.Model):
+    """Result of an offline client's operation, kept so retried uploads are not applied twice."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    client_op_id = models.CharField(max_length=64)
+    result = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('shop', 'client_op_id')
+
+    def __str__(self):
+        return self.client_op_id
+
+
+class VegetableForecast(models.Model):
+    """Exponentially weighted sales statistics per vegetable, kept current by sales.forecasting."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    vegetable = models.ForeignKey(Vegetable, on_delete=models.CASCADE)
+    last_date = models.DateField()
+    observations = models.PositiveIntegerField(default=0)
+    quantity_mean = models.FloatField()
+    quantity_var = models.FloatField()
+    margin_mean = models.FloatField()  # Selling minus purchase price per unit
+    loss_mean = models.FloatField()  # Money lost per day
+    suggested_quantity = models.FloatField()
+
+    # State before last_date was folded in, so re-saving that day replaces its
+    # contribution instead of counting it twice. Null when last_date was the first day.
+    prev_quantity_mean = models.FloatField(null=True)
+    prev_quantity_var = models.FloatField(null=True)
+    prev_margin_mean = models.FloatField(null=True)
+    prev_loss_mean = models.FloatField(null=True)
+
+    class Meta:
+        unique_together = ('shop', 'vegetable')
+
+    def __str__(self):
+        return f"{self.vegetable} forecast after {self.last_date}"
+
+
+class ArchivedMonth(models.Model):
+    """A closed month of VegetableSale rows moved to columnar files (see sales.archive)."""
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_constraint=False, db_index=False)
+    month = models.DateField()  # First day of the month
+    path = models.CharField(max_length=255)  # Relative to settings.SALES_ARCHIVE_ROOT
+    row_count = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64)  # SHA-256 of the manifest
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('shop', 'month')
+
+    def __str__(self):
+        return f"{self.shop_id} {self.month:%Y-%m}"
@@ -0,0 +1,48 @@
+import numpy as np
+
+from . import catalog
+
+
+def monthly_rollup(vegetable_ids, quantity, purchase_price, selling_price):
+    """Roll sales columns up per vegetable, indexing the sums straight by catalog id.
+
+    Prices and quantities may contain NaN for fields left blank; such rows count
+    towards the vegetable list but not towards any totals.
+    """
+    vegetable_ids = np.asarray(vegetable_ids, dtype=np.int64)
+    quantity = np.asarray(quantity, dtype=np.float64)
+    purchase_price = np.asarray(purchase_price, dtype=np.float64)
+    selling_price = np.asarray(selling_price, dtype=np.float64)
+
+    complete = ~(np.isnan(quantity) | np.isnan(purchase_price) | np.isnan(selling_price))
+    purchase_value = np.where(complete, purchase_price * quantity, 0.0)
+    selling_value = np.where(complete, selling_price * quantity, 0.0)
+    margin = selling_value - purchase_value
+    profit = np.where(margin >= 0, margin, 0.0)
+    loss = np.where(margin < 0, -margin, 0.0)
+
+    size = int(vegetable_ids.max()) + 1 if vegetable_ids.size else 0
+    present = np.bincount(vegetable_ids, minlength=size) > 0
+    ids = np.flatnonzero(present)
+    per_quantity = np.bincount(vegetable_ids, weights=np.where(complete, quantity, 0.0), minlength=size)
+    per_profit = np.bincount(vegetable_ids, weights=profit, minlength=size)
+    per_loss = np.bincount(vegetable_ids, weights=loss, minlength=size)
+
+    names = catalog.vegetable_names([int(veg_id) for veg_id in ids])
+    vegetable_data = [
+        {
+            'vegetable': names[int(veg_id)],
+            'quantity': float(per_quantity[veg_id]),
+            'profit': float(per_profit[veg_id]),
+            'loss': float(per_loss[veg_id]),
+        }
+        for veg_id in ids
+    ]
+
+    summary_data = {
+        'total_investment': float(purchase_value.sum()),
+        'total_revenue': float(selling_value.sum()),
+        'total_profit': float(profit.sum()),
+        'total_loss': float(loss.sum()),
+    }
+    return vegetable_data, summary_data
@@ -0,0 +1,30 @@
+from . import shops
+from .models import Shop, ShopMembership
+
+# Models kept with the shop registry on the default database
+REGISTRY_MODELS = (Shop, ShopMembership)
+
+
+class ShopRouter:
+    """Place each shop's sales data on the database named by ``Shop.database``.
+
+    The shop registry itself always lives on the default database. Enable by
+    listing extra databases in the ``SHOP_DATABASE_URLS`` environment variable.
+    """
+
+    def _db_for_model(self, model):
+        if model._meta.app_label != 'sales' or model in REGISTRY_MODELS:
+            return None
+        return shops.active_database()
+
+    def db_for_read(self, model, **hints):
+        return self._db_for_model(model)
+
+    def db_for_write(self, model, **hints):
+        return self._db_for_model(model)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Shop foreign keys are not enforced in SQL, so they may span databases
+        if isinstance(obj1, REGISTRY_MODELS) or isinstance(obj2, REGISTRY_MODELS):
+            return True
+        return None
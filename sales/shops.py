@@ -0,0 +1,48 @@
+from contextvars import ContextVar
+
+from .models import Shop, ShopMembership
+
+DEFAULT_SHOP_SLUG = 'default'
+
+# Database alias of the shop being served by the current request (see ShopRouter)
+_active_database = ContextVar('sales_active_database', default=None)
+
+
+def get_default_shop():
+    """Return the shop staff are served when they have not picked one."""
+    shop, _ = Shop.objects.get_or_create(slug=DEFAULT_SHOP_SLUG, defaults={'name': 'SLV Vegetables'})
+    return shop
+
+
+def resolve_shop(request):
+    """Return the shop the request's user works for, or None if they are not bound to one.
+
+    Clerks and devices are served the shop of their ShopMembership. Staff may
+    pick any shop (see views.set_shop) and otherwise get their own or the default.
+    """
+    user = request.user
+    if not user.is_authenticated:
+        return None
+    membership = ShopMembership.objects.filter(user=user).select_related('shop').first()
+    if not user.is_staff:
+        return membership.shop if membership else None
+
+    shop_id = request.session.get('shop_id')
+    if shop_id:
+        shop = Shop.objects.filter(id=shop_id).first()
+        if shop is not None:
+            return shop
+    return membership.shop if membership else get_default_shop()
+
+
+def activate(shop):
+    """Route sales queries to the shop's database until deactivate() is called."""
+    return _active_database.set(shop.database)
+
+
+def deactivate(token):
+    _active_database.reset(token)
+
+
+def active_database():
+    return _active_database.get()
@@ -0,0 +1,55 @@
+from django.db import connections, router, transaction
+from django.db.models import F, Sum
+
+from .changes import record_changes
+from .models import ChangeLogEntry, DailySummary, VegetableSale
+
+
+def recompute_daily_summaries(sales):
+    """Rebuild DailySummary for every (shop, date) covered by the ``sales`` queryset.
+
+    Totals are computed with one grouped aggregate and written with one upsert,
+    so the cost does not grow with the number of rows per day. Other days of the
+    same shops may be refreshed too, which is harmless since the result is the same.
+    """
+    groups = (
+        VegetableSale.objects
+        .filter(shop_id__in=sales.values('shop_id'), date__in=sales.values('date'))
+        .values('shop_id', 'date')
+        .annotate(
+            total_purchase=Sum(F('quantity') * F('purchase_price')),
+            total_selling=Sum(F('quantity') * F('selling_price')),
+        )
+        .order_by()
+    )
+
+    summaries = []
+    for group in groups:
+        total_purchase = group['total_purchase'] or 0
+        total_selling = group['total_selling'] or 0
+        summaries.append(DailySummary(
+            shop_id=group['shop_id'],
+            date=group['date'],
+            total_purchase_price=total_purchase,
+            total_selling_price=total_selling,
+            total_profit=max(0, total_selling - total_purchase),
+            total_loss=max(0, total_purchase - total_selling),
+        ))
+
+    db = router.db_for_write(DailySummary)
+    # MySQL upserts on any unique key and rejects an explicit conflict target
+    unique_fields = ['shop', 'date'] if connections[db].features.supports_update_conflicts_with_target else None
+    with transaction.atomic(using=db):
+        DailySummary.objects.using(db).bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=['total_purchase_price', 'total_selling_price', 'total_profit', 'total_loss'],
+        )
+        # Upserted rows do not report their ids on every backend, so look them up for the change feed
+        shops = {summary.shop_id for summary in summaries}
+        for shop_id in shops:
+            dates = [summary.date for summary in summaries if summary.shop_id == shop_id]
+            ids = DailySummary.objects.using(db).filter(shop_id=shop_id, date__in=dates).values_list('id', flat=True)
+            record_changes(shop_id, ChangeLogEntry.SUMMARY, ids)
+    return summaries
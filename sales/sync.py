@@ -0,0 +1,136 @@
+from datetime import date
+
+from django.db import IntegrityError, router, transaction
+
+from . import catalog
+from .archive import ARCHIVED_MESSAGE, is_archived
+from .changes import record_changes
+from .editing import EDITABLE_FIELDS, apply_sale_edits
+from .forecasting import forget_sales, update_forecasts
+from .models import ChangeLogEntry, DailySummary, SyncOperation, VegetableSale
+
+FEED_LIMIT = 500
+MAX_FEED_LIMIT = 1000
+MAX_UPLOAD_OPERATIONS = 500
+
+SALE_FIELDS = ('id', 'vegetable_id', 'date', 'quantity', 'purchase_price', 'selling_price', 'version')
+SUMMARY_FIELDS = ('id', 'date', 'total_purchase_price', 'total_selling_price', 'total_profit', 'total_loss')
+
+
+def _serialize(row):
+    row['date'] = row['date'].isoformat()
+    return row
+
+
+def change_feed(shop, cursor, limit=FEED_LIMIT):
+    """Rows changed after ``cursor``, in current state, with tombstones for deleted ones.
+
+    A row changed several times is sent once. Pass the returned ``cursor`` back
+    to continue; ``has_more`` says whether another page is waiting.
+    """
+    entries = list(
+        ChangeLogEntry.objects.filter(shop=shop, seq__gt=cursor)
+        .order_by('seq')
+        .values_list('seq', 'kind', 'object_id', 'deleted')[:limit + 1]
+    )
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    latest = {}
+    for seq, kind, object_id, deleted in entries:
+        latest[(kind, object_id)] = deleted
+
+    changed = {ChangeLogEntry.SALE: [], ChangeLogEntry.SUMMARY: []}
+    deleted = {ChangeLogEntry.SALE: set(), ChangeLogEntry.SUMMARY: set()}
+    for (kind, object_id), is_deleted in latest.items():
+        (deleted[kind].add if is_deleted else changed[kind].append)(object_id)
+
+    sales = [
+        _serialize(row)
+        for row in VegetableSale.objects.filter(shop=shop, id__in=changed[ChangeLogEntry.SALE]).values(*SALE_FIELDS)
+    ]
+    names = catalog.vegetable_names({row['vegetable_id'] for row in sales})
+    for row in sales:
+        row['vegetable'] = names[row['vegetable_id']]
+    summaries = [
+        _serialize(row)
+        for row in DailySummary.objects.filter(shop=shop, id__in=changed[ChangeLogEntry.SUMMARY]).values(*SUMMARY_FIELDS)
+    ]
+
+    # Rows deleted after this page was logged are reported as deleted straight away
+    deleted[ChangeLogEntry.SALE].update(set(changed[ChangeLogEntry.SALE]) - {row['id'] for row in sales})
+    deleted[ChangeLogEntry.SUMMARY].update(set(changed[ChangeLogEntry.SUMMARY]) - {row['id'] for row in summaries})
+
+    return {
+        'cursor': entries[-1][0] if entries else cursor,
+        'has_more': has_more,
+        'sales': sales,
+        'summaries': summaries,
+        'deleted': {kind: sorted(ids) for kind, ids in deleted.items()},
+    }
+
+
+def _upsert_sale(shop, operation):
+    day = date.fromisoformat(operation['date'])
+    if is_archived(shop, day):
+        return {'status': 'error', 'message': ARCHIVED_MESSAGE}
+    vegetable_id = catalog.get_vegetable_id(operation['vegetable'])
+    values = {field: float(operation[field]) for field in EDITABLE_FIELDS if operation.get(field) is not None}
+    sale, created = VegetableSale.objects.get_or_create(
+        shop=shop, vegetable_id=vegetable_id, date=day, defaults=values,
+    )
+    if created:
+        record_changes(shop, ChangeLogEntry.SALE, [sale.id])
+        update_forecasts(shop, [sale.id])
+        return {'status': 'applied', 'id': sale.id, 'version': sale.version}
+
+    saved, conflicts = apply_sale_edits(shop, [{'id': sale.id, 'version': operation['version'], **values}])
+    if conflicts:
+        return {'status': 'conflict', 'id': sale.id, 'current': conflicts[0]}
+    return {'status': 'applied', **saved[0]}
+
+
+def _delete_sale(shop, operation):
+    if is_archived(shop, date.fromisoformat(operation['date'])):
+        return {'status': 'error', 'message': ARCHIVED_MESSAGE}
+    vegetable_id = catalog.get_vegetable_id(operation['vegetable'], create=False)
+    day = date.fromisoformat(operation['date'])
+    ids = list(VegetableSale.objects.filter(shop=shop, vegetable_id=vegetable_id, date=day).values_list('id', flat=True))
+    VegetableSale.objects.filter(id__in=ids).delete()
+    record_changes(shop, ChangeLogEntry.SALE, ids, deleted=True)
+    forget_sales(shop, [(vegetable_id, day)] if ids else [])
+    return {'status': 'applied', 'deleted': ids}
+
+
+OPERATIONS = {
+    'upsert_sale': _upsert_sale,
+    'delete_sale': _delete_sale,
+}
+
+
+def apply_operation(shop, operation):
+    """Apply one client operation exactly once, keyed by its ``op_id``.
+
+    A retried operation returns the result stored the first time. Runs in the
+    caller's transaction so the change and its SyncOperation commit together.
+    """
+    op_id = str(operation['op_id'])
+    stored = SyncOperation.objects.filter(shop=shop, client_op_id=op_id).values_list('result', flat=True).first()
+    if stored is not None:
+        return stored
+
+    handler = OPERATIONS.get(operation.get('type'))
+    if handler is None:
+        return {'op_id': op_id, 'status': 'error', 'message': 'Unknown operation type.'}
+
+    try:
+        with transaction.atomic(using=router.db_for_write(SyncOperation)):
+            result = {'op_id': op_id, **handler(shop, operation)}
+            SyncOperation.objects.create(shop=shop, client_op_id=op_id, result=result)
+    except IntegrityError:
+        # Usually a concurrent retry of the same operation won the race; report its result
+        stored = SyncOperation.objects.filter(shop=shop, client_op_id=op_id).values_list('result', flat=True).first()
+        return stored or {'op_id': op_id, 'status': 'error', 'message': 'Conflicting concurrent write, retry.'}
+    except (KeyError, ValueError, TypeError, AttributeError):
+        return {'op_id': op_id, 'status': 'error', 'message': 'Invalid operation.'}
+    return result
@@ -1,3 +1,510 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+import threading
+import time
+from datetime import date
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+
+from . import archive, catalog
+from .archive import ArchiveError, archive_month, restore_month
+from .batching import GroupCommitBatcher
+from .charts import MAX_WIDTH, MIN_DPI, chart_options, open_figure_count
+from .forecasting import STAT_FIELDS, backfill_forecasts
+from .models import (
+    ArchivedMonth, ChangeLogEntry, DailySummary, Shop, ShopMembership, SyncOperation, Vegetable, VegetableForecast,
+    VegetableSale,
+)
+from .shops import get_default_shop
+from .timeseries import bucket_minmax, downsample_series, lttb
+
+
+def clerk(username, shop):
+    user = User.objects.create_user(username)
+    ShopMembership.objects.create(user=user, shop=shop)
+    return user
+
+
+class ClerkTestCase(TestCase):
+    """Requests are made by a clerk of the default shop."""
+
+    def setUp(self):
+        self.client.force_login(clerk('clerk', get_default_shop()))
+
+
+class ShopScopingTests(TestCase):
+    def setUp(self):
+        self.other = Shop.objects.create(name='Other', slug='other')
+
+    def test_unbound_users_are_refused(self):
+        self.assertRedirects(self.client.get('/'), '/accounts/login/?next=/', fetch_redirect_response=False)
+
+        self.client.force_login(User.objects.create_user('stranger'))
+        self.assertEqual(self.client.get('/api/sync/changes/').status_code, 403)
+
+    def test_clerks_only_see_their_own_shop(self):
+        tomato = catalog.get_vegetable_id('Tomato')
+        theirs = VegetableSale.objects.create(shop=self.other, vegetable_id=tomato, date=date(2026, 1, 5), quantity=7)
+
+        self.client.force_login(clerk('north', get_default_shop()))
+        self.client.post('/set_date/', {'date': '2026-01-05'})
+        self.assertEqual(self.client.post('/set_shop/', {'shop': 'other'}).status_code, 403)
+        page = self.client.get('/')
+        self.assertEqual(page.context['shop'].slug, 'default')
+        self.assertNotIn(7, [veg.quantity for veg in page.context['vegetables']])
+        feed = self.client.get('/api/sync/changes/').json()
+        self.assertNotIn(theirs.id, [row['id'] for row in feed['sales']])
+        edit = {'rows': [{'id': theirs.id, 'version': 1, 'quantity': 0}]}
+        self.client.post('/api/bulk-edit/', json.dumps(edit), content_type='application/json')
+        theirs.refresh_from_db()
+        self.assertEqual(theirs.quantity, 7)
+
+        self.client.force_login(clerk('south', self.other))
+        self.client.post('/set_date/', {'date': '2026-01-05'})
+        page = self.client.get('/')
+        self.assertEqual(page.context['shop'], self.other)
+        self.assertIn(7, [veg.quantity for veg in page.context['vegetables']])
+
+    def test_staff_can_switch_shop(self):
+        self.client.force_login(User.objects.create_user('manager', is_staff=True))
+        self.assertTrue(self.client.post('/set_shop/', {'shop': 'other'}).json()['success'])
+        self.assertEqual(self.client.get('/').context['shop'], self.other)
+
+
+class CatalogCacheTests(ClerkTestCase):
+    def test_rolled_back_catalog_rows_are_not_cached(self):
+        operation = {'op_id': 'a1', 'type': 'upsert_sale', 'vegetable': 'Kale', 'date': 'bad', 'version': None}
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/sync/upload/', json.dumps({'operations': [operation]}),
+                                        content_type='application/json')
+        self.assertEqual(response.json()['results'][0]['status'], 'error')
+        self.assertFalse(Vegetable.objects.filter(name='Kale').exists())
+        self.assertNotIn(('default', 'Kale'), catalog._ids_by_name)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/add/', {'vegetable_name': 'kale'})
+        self.assertTrue(response.json()['success'])
+        self.assertEqual(catalog.get_vegetable_id('Kale', create=False), Vegetable.objects.get(name='Kale').id)
+
+
+class SaleEditTests(ClerkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.sale = VegetableSale.objects.create(
+            shop=get_default_shop(), vegetable_id=catalog.get_vegetable_id('Tomato'), date=date(2026, 1, 5),
+        )
+
+    def post_json(self, url, payload):
+        return self.client.post(url, json.dumps(payload), content_type='application/json')
+
+    def test_stale_version_is_a_conflict(self):
+        first = self.post_json('/api/bulk-edit/', {'rows': [{'id': self.sale.id, 'version': 1, 'quantity': 5}]})
+        self.assertEqual(first.json()['saved'], [{'id': self.sale.id, 'version': 2}])
+
+        second = self.post_json('/api/bulk-edit/', {'rows': [{'id': self.sale.id, 'version': 1, 'quantity': 9}]})
+        self.assertEqual(second.status_code, 409)
+        self.assertEqual(second.json()['conflicts'][0]['quantity'], 5)
+        self.sale.refresh_from_db()
+        self.assertEqual((self.sale.quantity, self.sale.version), (5, 2))
+
+    def test_version_is_required(self):
+        response = self.post_json('/api/bulk-edit/', {'rows': [{'id': self.sale.id, 'quantity': 5}]})
+        self.assertEqual(response.status_code, 400)
+
+        operation = {'op_id': 'u1', 'type': 'upsert_sale', 'vegetable': 'Tomato', 'date': '2026-01-05', 'quantity': 5}
+        self.assertEqual(self.post_json('/api/sync/upload/', {'operations': [operation]}).status_code, 400)
+        self.sale.refresh_from_db()
+        self.assertIsNone(self.sale.quantity)
+
+    def test_save_data_reports_what_is_wrong(self):
+        session = self.client.session
+        session['selected_date'] = '2026-01-05'
+        session.save()
+        row = {f'quantity_{self.sale.id}': '', f'purchase_price_{self.sale.id}': '10',
+               f'selling_price_{self.sale.id}': '12', f'version_{self.sale.id}': '1'}
+        self.assertIn('must be numbers', self.client.post('/save/', row).json()['message'])
+        del row[f'version_{self.sale.id}']
+        self.assertIn('version', self.client.post('/save/', {**row, f'quantity_{self.sale.id}': '3'}).json()['message'])
+
+    def test_stale_admin_form_does_not_overwrite(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        url = f'/admin/sales/vegetablesale/{self.sale.id}/change/'
+        form = {'shop': self.sale.shop_id, 'date': '2026-01-05', 'vegetable': self.sale.vegetable_id,
+                'quantity': 8, 'loaded_version': 1}
+        self.post_json('/api/bulk-edit/', {'rows': [{'id': self.sale.id, 'version': 1, 'quantity': 5}]})
+
+        response = self.client.post(url, form)
+        self.assertContains(response, 'Someone else changed this sale')
+        self.sale.refresh_from_db()
+        self.assertEqual((self.sale.quantity, self.sale.version), (5, 2))
+
+        self.assertEqual(self.client.post(url, {**form, 'loaded_version': 2}).status_code, 302)
+        self.sale.refresh_from_db()
+        self.assertEqual((self.sale.quantity, self.sale.version), (8, 3))
+
+    def test_upsert_without_a_seen_version_does_not_overwrite(self):
+        operation = {'op_id': 'u1', 'type': 'upsert_sale', 'vegetable': 'Tomato', 'date': '2026-01-05',
+                     'version': None, 'quantity': 5}
+        result = self.post_json('/api/sync/upload/', {'operations': [operation]}).json()['results'][0]
+        self.assertEqual(result['status'], 'conflict')
+
+    def test_retried_upload_is_applied_once(self):
+        operation = {'op_id': 'u1', 'type': 'upsert_sale', 'vegetable': 'Onion', 'date': '2026-01-05',
+                     'version': None, 'quantity': 5}
+        first = self.post_json('/api/sync/upload/', {'operations': [operation]}).json()['results']
+        retry = self.post_json('/api/sync/upload/', {'operations': [{**operation, 'quantity': 7}]}).json()['results']
+        self.assertEqual(first, retry)
+        self.assertEqual(VegetableSale.objects.get(vegetable__name='Onion').quantity, 5)
+        self.assertEqual(SyncOperation.objects.count(), 1)
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.shop = get_default_shop()
+
+    def feed(self):
+        return self.client.get('/api/sync/changes/', {'cursor': 0}).json()
+
+    def test_admin_summary_edits_and_deletes_are_logged(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        summary = DailySummary.objects.create(shop=self.shop, date=date(2026, 1, 5))
+        self.client.post(f'/admin/sales/dailysummary/{summary.id}/change/', {
+            'shop': self.shop.id, 'date': '2026-01-05', 'total_purchase_price': 10, 'total_selling_price': 12,
+            'total_profit': 2, 'total_loss': 0,
+        })
+        self.assertEqual([row['total_profit'] for row in self.feed()['summaries']], [2])
+
+        self.client.post(f'/admin/sales/dailysummary/{summary.id}/delete/', {'post': 'yes'})
+        self.assertEqual(self.feed()['deleted'][ChangeLogEntry.SUMMARY], [summary.id])
+
+
+class ForecastTests(ClerkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.shop = get_default_shop()
+        tomato = catalog.get_vegetable_id('Tomato')
+        self.sales = [
+            VegetableSale.objects.create(shop=self.shop, vegetable_id=tomato, date=date(2026, 1, day))
+            for day in range(1, 5)
+        ]
+
+    def edit(self, *rows):
+        edits = [{'id': sale.id, 'version': sale.version, 'quantity': quantity, 'purchase_price': 10,
+                  'selling_price': 12} for sale, quantity in rows]
+        response = self.client.post('/api/bulk-edit/', json.dumps({'rows': edits}), content_type='application/json')
+        for sale, _ in rows:
+            sale.refresh_from_db()
+        return response
+
+    def assertMatchesBackfill(self):
+        incremental = VegetableForecast.objects.values(*STAT_FIELDS, 'last_date', 'observations').get()
+        backfill_forecasts(self.shop)
+        rebuilt = VegetableForecast.objects.values(*STAT_FIELDS, 'last_date', 'observations').get()
+        self.assertEqual(incremental.pop('last_date'), rebuilt.pop('last_date'))
+        self.assertEqual(incremental.pop('observations'), rebuilt.pop('observations'))
+        for field in STAT_FIELDS:
+            self.assertAlmostEqual(incremental[field], rebuilt[field])
+
+    def test_days_in_order(self):
+        for sale, quantity in zip(self.sales, [30, 50, 40, 60]):
+            self.edit((sale, quantity))
+        self.edit((self.sales[-1], 65))  # Re-saving the latest day
+        self.assertMatchesBackfill()
+
+    def test_correcting_an_earlier_day(self):
+        for sale, quantity in zip(self.sales, [30, 50, 40, 60]):
+            self.edit((sale, quantity))
+        self.edit((self.sales[1], 5))
+        self.assertMatchesBackfill()
+
+    def test_bulk_edit_across_days(self):
+        self.edit((self.sales[0], 30), (self.sales[1], 50))
+        self.edit((self.sales[2], 40), (self.sales[0], 80), (self.sales[3], 20))
+        self.assertMatchesBackfill()
+
+    def test_deleting_an_earlier_day(self):
+        for sale, quantity in zip(self.sales, [30, 50, 40, 60]):
+            self.edit((sale, quantity))
+        self.client.post('/set_date/', {'date': '2026-01-02'})
+        self.client.post('/delete/', {'vegetable_name': 'Tomato'})
+        self.assertEqual(VegetableForecast.objects.get().observations, 3)
+        self.assertMatchesBackfill()
+
+    def test_deleting_the_only_day(self):
+        self.edit((self.sales[0], 30))
+        operation = {'op_id': 'delete-1', 'type': 'delete_sale', 'vegetable': 'Tomato', 'date': '2026-01-01'}
+        response = self.client.post('/api/sync/upload/', json.dumps({'operations': [operation]}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['results'][0]['status'], 'applied')
+        self.assertFalse(VegetableForecast.objects.exists())
+        self.assertEqual(self.client.get('/ajax/reorder-suggestions/').json()['suggestions'], [])
+
+
+class ChartOptionsTests(ClerkTestCase):
+    def options(self, query=None, **headers):
+        return chart_options(RequestFactory().get('/', query or {}, headers=headers), (800, 400))
+
+    def test_defaults_and_explicit_values(self):
+        options = self.options()
+        self.assertEqual((options.width, options.height, options.dpi, options.format), (800, 400, 100, 'png8'))
+        options = self.options({'width': '600', 'height': '300', 'dpi': '150', 'format': 'SVG'})
+        self.assertEqual((options.width, options.height, options.dpi, options.mime), (600, 300, 150, 'image/svg+xml'))
+
+    def test_values_are_clamped_and_bad_input_falls_back(self):
+        options = self.options({'width': '99999', 'dpi': '1'})
+        self.assertEqual((options.width, options.dpi), (MAX_WIDTH, MIN_DPI))
+        options = self.options({'width': 'wide', 'format': 'gif'})
+        self.assertEqual((options.width, options.format, options.mime), (800, 'png8', 'image/png'))
+
+    def test_client_hints_and_mobile_sizing(self):
+        options = self.options(sec_ch_dpr='2', sec_ch_viewport_width='500')
+        self.assertEqual((options.width, options.height, options.dpi), (1000, 500, 200))
+        options = self.options(user_agent='Mozilla/5.0 (Linux; Android 14) Mobile')
+        self.assertEqual((options.width, options.height), (480, 240))
+
+    def test_pages_request_client_hints(self):
+        self.assertIn('Sec-CH-DPR', self.client.get('/monthly-analysis/')['Accept-CH'])
+        self.assertIn('Sec-CH-Viewport-Width', self.client.get('/')['Accept-CH'])
+
+    def test_chart_response_carries_the_mime(self):
+        VegetableSale.objects.create(shop=get_default_shop(), vegetable_id=catalog.get_vegetable_id('Tomato'),
+                                     date=date(2026, 1, 5), quantity=3, purchase_price=10, selling_price=12)
+        response = self.client.get('/ajax/monthly-analysis-data/', {'month': '2026-01', 'format': 'webp'})
+        self.assertTrue(response.json()['quantity_chart'].startswith('data:image/webp;base64,'))
+
+
+class TimeSeriesTests(ClerkTestCase):
+    def series(self, n=5000):
+        t = np.arange(n, dtype=np.int64)
+        return t, np.sin(t / 50.0) * 10 + t % 7
+
+    def test_lttb_keeps_the_ends_within_the_budget(self):
+        t, v = self.series()
+        keep = lttb(t, v, 100)
+        self.assertEqual(len(keep), 100)
+        self.assertEqual((keep[0], keep[-1]), (0, len(t) - 1))
+        self.assertTrue(np.all(np.diff(keep) > 0))
+
+    def test_minmax_buckets_cover_the_range(self):
+        t, v = self.series()
+        bt, avg, low, high = bucket_minmax(t, v, 100)
+        self.assertLessEqual(len(bt), 100)
+        self.assertEqual(bt[0], t[0])
+        self.assertEqual((low.min(), high.max()), (v.min(), v.max()))
+        self.assertTrue(np.all((low <= avg) & (avg <= high)))
+
+    def test_downsample_skips_blank_days_in_both_modes(self):
+        t, v = self.series()
+        v[::3] = np.nan
+        for mode in ('lttb', 'minmax'):
+            series = downsample_series(t, {'quantity': v}, 200, mode)['quantity']
+            self.assertLessEqual(len(series['t']), 200)
+            self.assertFalse(np.isnan(series['v']).any())
+            self.assertNotIn(0, series['t'])  # Day 0 is blank
+        short = downsample_series(t[:10], {'quantity': v[:10]}, 200, 'lttb')['quantity']
+        self.assertEqual(short['t'], [1, 2, 4, 5, 7, 8])
+
+    def test_endpoint(self):
+        tomato = catalog.get_vegetable_id('Tomato')
+        first = date(2024, 1, 1).toordinal()
+        VegetableSale.objects.bulk_create([
+            VegetableSale(shop=get_default_shop(), vegetable_id=tomato, date=date.fromordinal(first + i),
+                          quantity=i % 9, purchase_price=10 + i % 5, selling_price=12 + i % 4)
+            for i in range(700)
+        ])
+        url = '/ajax/vegetable-timeseries/'
+        body = self.client.get(url, {'vegetable': 'tomato', 'points': '50', 'mode': 'minmax'}).json()
+        self.assertEqual((body['start'], body['raw_points']), ('2024-01-01', 700))
+        self.assertTrue(all(len(series['t']) <= 50 for series in body['series'].values()))
+
+        body = self.client.get(url, {'vegetable': 'tomato', 'points': '50'}).json()
+        self.assertEqual(body['series']['quantity']['t'][-1], 699)
+
+        self.assertEqual(self.client.get(url, {'vegetable': 'nope'}).status_code, 404)
+        self.assertEqual(self.client.get(url, {'vegetable': 'tomato', 'start': 'bad'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'vegetable': 'tomato', 'points': 'many'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'vegetable': 'tomato', 'mode': 'cubic'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'vegetable': 'tomato', 'end': '2000-01-01'}).status_code, 404)
+
+
+class AdminTests(TestCase):
+    def test_vegetable_catalog_is_read_only(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+        tomato = catalog.get_vegetable_id('Tomato')
+        self.assertEqual(self.client.get(f'/admin/sales/vegetable/{tomato}/change/').status_code, 200)
+        self.client.post(f'/admin/sales/vegetable/{tomato}/change/', {'name': 'tomato '})
+        self.assertEqual(self.client.post(f'/admin/sales/vegetable/{tomato}/delete/', {'post': 'yes'}).status_code, 403)
+        self.assertEqual(self.client.get('/admin/sales/vegetable/add/').status_code, 403)
+        self.assertEqual(Vegetable.objects.get(id=tomato).name, 'Tomato')
+
+
+class ChartSoakTests(ClerkTestCase):
+    def test_renders_release_every_figure(self):
+        out = io.StringIO()
+        call_command('chart_soak', renders=60, warmup=5, fail_every=4, stdout=out)
+        self.assertEqual(open_figure_count(), 0)
+        self.assertIn('Rendered 60 charts', out.getvalue())
+
+    def test_chart_views_release_figures(self):
+        VegetableSale.objects.create(
+            shop=get_default_shop(), vegetable_id=catalog.get_vegetable_id('Tomato'), date=date(2026, 1, 5),
+            quantity=3, purchase_price=10, selling_price=12,
+        )
+        response = self.client.get('/ajax/monthly-analysis-data/', {'month': '2026-01'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(open_figure_count(), 0)
+
+
+class GroupCommitTests(TestCase):
+    def test_callers_fail_when_the_batch_transaction_cannot_start(self):
+        atomic = transaction.atomic
+
+        def locked_in_writer(*args, **kwargs):
+            if threading.current_thread().name.startswith('group-commit'):
+                raise OperationalError('database is locked')
+            return atomic(*args, **kwargs)
+
+        batcher = GroupCommitBatcher('default', window=0.01, max_batch=8, timeout=5)
+        with mock.patch.object(transaction, 'atomic', side_effect=locked_in_writer):
+            started = time.monotonic()
+            with self.assertRaises(OperationalError):
+                batcher.submit(lambda: None)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_submit_gives_up_after_the_timeout(self):
+        batcher = GroupCommitBatcher('default', window=0.01, max_batch=8, timeout=0.05)
+        release = threading.Event()
+        batcher._ensure_thread = lambda: None  # No writer thread, so nothing ever runs
+        with self.assertRaises(TimeoutError):
+            batcher.submit(release.set)
+        self.assertFalse(release.is_set())
+
+
+class VegetableCatalogMigrationTests(TransactionTestCase):
+    def migrate(self, target):
+        executor = MigrationExecutor(connection)
+        executor.migrate([('sales', target)])
+        return executor.loader.project_state([('sales', target)]).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes('sales')[0][1])
+
+    def test_split_entries_are_merged(self):
+        old_apps = self.migrate('0007_reportsummary')
+        OldSale = old_apps.get_model('sales', 'VegetableSale')
+        day = date(2026, 1, 5)
+        OldSale.objects.create(vegetable='Tomato', date=day, quantity=10, purchase_price=20, selling_price=25)
+        OldSale.objects.create(vegetable='tomato ', date=day, quantity=4, purchase_price=30, selling_price=32)
+        OldSale.objects.create(vegetable='TOMATO', date=day)
+        OldSale.objects.create(vegetable='Onion', date=day, quantity=3)
+
+        new_apps = self.migrate('0009_vegetable_catalog')
+        Sale = new_apps.get_model('sales', 'VegetableSale')
+        tomato = Sale.objects.get(vegetable__name='Tomato')
+        self.assertEqual(tomato.quantity, 14)
+        self.assertAlmostEqual(tomato.quantity * tomato.purchase_price, 10 * 20 + 4 * 30)
+        self.assertAlmostEqual(tomato.quantity * tomato.selling_price, 10 * 25 + 4 * 32)
+        self.assertEqual(Sale.objects.get(vegetable__name='Onion').quantity, 3)
+        self.assertEqual(Sale.objects.count(), 2)
+
+
+class ArchiveTests(ClerkTestCase):
+    def setUp(self):
+        super().setUp()
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        override = override_settings(SALES_ARCHIVE_ROOT=Path(self.root))
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.shop = get_default_shop()
+        self.tomato = catalog.get_vegetable_id('Tomato')
+        VegetableSale.objects.bulk_create([
+            VegetableSale(shop=self.shop, vegetable_id=self.tomato, date=date(2026, 1, day),
+                          quantity=None if day == 3 else day, purchase_price=10, selling_price=12)
+            for day in range(1, 29)
+        ])
+        self.original = sorted(VegetableSale.objects.values_list('id', 'date', 'quantity', 'version'))
+
+    def test_round_trip(self):
+        before = self.client.get('/ajax/monthly-analysis-data/', {'month': '2026-01'}).json()
+        archived = archive_month(self.shop, date(2026, 1, 1))
+        self.assertFalse(VegetableSale.objects.exists())
+
+        after = self.client.get('/ajax/monthly-analysis-data/', {'month': '2026-01'}).json()
+        self.assertEqual(after['vegetables'], before['vegetables'])
+        self.assertEqual(after['summary'], before['summary'])
+
+        restore_month(archived)
+        self.assertEqual(sorted(VegetableSale.objects.values_list('id', 'date', 'quantity', 'version')), self.original)
+
+    def test_restore_tombstones_placeholder_rows(self):
+        archived = archive_month(self.shop, date(2026, 1, 1))
+        placeholder = VegetableSale.objects.create(shop=self.shop, vegetable_id=self.tomato, date=date(2026, 1, 30))
+        restore_month(archived)
+        self.assertFalse(VegetableSale.objects.filter(id=placeholder.id).exists())
+        self.assertTrue(ChangeLogEntry.objects.filter(object_id=placeholder.id, deleted=True).exists())
+
+    def test_archived_month_is_read_only(self):
+        archive_month(self.shop, date(2026, 1, 1))
+        session = self.client.session
+        session['selected_date'] = '2026-01-05'
+        session.save()
+
+        page = self.client.get('/')
+        self.assertEqual([veg['quantity'] for veg in page.context['vegetables']], [5])
+        self.assertFalse(VegetableSale.objects.exists())
+
+        self.assertEqual(self.client.post('/add/', {'vegetable_name': 'Onion'}).status_code, 409)
+        self.assertEqual(self.client.post('/save/', {}).status_code, 409)
+        self.assertEqual(self.client.get('/calculate/').status_code, 409)
+        operation = {'op_id': 'u1', 'type': 'upsert_sale', 'vegetable': 'Tomato', 'date': '2026-01-05',
+                     'version': None, 'quantity': 9}
+        response = self.client.post('/api/sync/upload/', json.dumps({'operations': [operation]}),
+                                    content_type='application/json')
+        self.assertEqual(response.json()['results'][0]['status'], 'error')
+        self.assertFalse(VegetableSale.objects.exists())
+
+    def test_timeseries_reads_archive_up_to_the_last_representable_day(self):
+        archive_month(self.shop, date(2026, 1, 1))
+        response = self.client.get('/ajax/vegetable-timeseries/', {'vegetable': 'tomato', 'end': '9999-12-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['raw_points'], 28)
+
+    def test_archive_refuses_a_month_changed_while_writing(self):
+        write_month = archive._write_month
+
+        def swap_a_row(*args):
+            # Same row count and version total, different rows
+            VegetableSale.objects.filter(date=date(2026, 1, 1)).delete()
+            VegetableSale.objects.create(shop=self.shop, vegetable_id=self.tomato, date=date(2026, 1, 29), quantity=7)
+            return write_month(*args)
+
+        with mock.patch.object(archive, '_write_month', side_effect=swap_a_row):
+            with self.assertRaises(ArchiveError):
+                archive_month(self.shop, date(2026, 1, 1))
+        self.assertEqual(VegetableSale.objects.count(), 28)
+        self.assertFalse(ArchivedMonth.objects.exists())
+
+    def test_day_views_read_archived_days(self):
+        archive_month(self.shop, date(2026, 1, 1))
+
+        report = self.client.post('/report/', {'selected_date': '2026-01-05'})
+        self.assertEqual([row['quantity'] for row in report.context['data']], [5])
+        self.assertEqual(report.context['summary'].total_selling, 60)
+
+        for url in ('/ajax/price-chart/', '/ajax/grouped-bar-chart/', '/ajax/stacked-profit-loss-chart/'):
+            response = self.client.get(url, {'date': '2026-01-03'})
+            self.assertEqual(response.status_code, 200, url)
+            self.assertTrue(response.json()['chart'])
+        self.assertEqual(self.client.get('/ajax/price-chart/', {'date': '2026-01-31'}).status_code, 404)
+        self.assertEqual(self.client.get('/ajax/price-chart/', {'date': 'someday'}).status_code, 400)
@@ -0,0 +1,86 @@
+import numpy as np
+
+DOWNSAMPLE_MODES = ('lttb', 'minmax')
+DEFAULT_POINTS = 500
+MIN_POINTS, MAX_POINTS = 10, 2000
+
+
+def lttb(t, v, threshold):
+    """Largest-Triangle-Three-Buckets: indices of ``threshold`` points that keep the shape of (t, v).
+
+    ``t`` must be sorted. The first and last points are always kept.
+    """
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    t = np.asarray(t, dtype=np.float64)
+    v = np.asarray(v, dtype=np.float64)
+    # Bucket boundaries over the interior points
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], max(edges[i + 1], edges[i] + 1)
+        next_start, next_end = edges[i + 1], edges[i + 2] if i + 2 < len(edges) else n
+        next_end = max(next_end, next_start + 1)
+        avg_t = t[next_start:next_end].mean()
+        avg_v = v[next_start:next_end].mean()
+
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's mean
+        area = np.abs(
+            (t[previous] - avg_t) * (v[start:end] - v[previous])
+            - (t[previous] - t[start:end]) * (avg_v - v[previous])
+        )
+        previous = start + int(np.argmax(area))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def bucket_minmax(t, v, buckets):
+    """Split sorted (t, v) into ``buckets`` equal time spans and return (t, avg, min, max) per non-empty span."""
+    t = np.asarray(t, dtype=np.int64)
+    v = np.asarray(v, dtype=np.float64)
+    edges = np.linspace(t[0], t[-1] + 1, buckets + 1)
+    index = np.searchsorted(edges, t, side='right') - 1
+
+    # t is sorted, so each bucket is a contiguous run that reduceat can fold
+    starts = np.flatnonzero(np.r_[True, index[1:] != index[:-1]])
+    counts = np.diff(np.r_[starts, len(t)])
+    return (
+        t[starts],
+        np.add.reduceat(v, starts) / counts,
+        np.minimum.reduceat(v, starts),
+        np.maximum.reduceat(v, starts),
+    )
+
+
+def _rounded(values, digits=3):
+    return np.round(values, digits).tolist()
+
+
+def downsample_series(t, columns, points, mode):
+    """Downsample each column of a daily series to at most ``points`` entries.
+
+    ``t`` holds day offsets from the start of the range; ``columns`` maps a series
+    name to values with NaN for days left blank. Each series is returned as
+    ``{"t": [...], "v": [...]}``, plus ``"min"``/``"max"`` in minmax mode.
+    """
+    series = {}
+    for name, values in columns.items():
+        valid = ~np.isnan(values)
+        st, sv = t[valid], values[valid]
+
+        if len(st) <= points:
+            series[name] = {'t': st.tolist(), 'v': _rounded(sv)}
+        elif mode == 'minmax':
+            bt, avg, low, high = bucket_minmax(st, sv, points)
+            series[name] = {'t': bt.tolist(), 'v': _rounded(avg), 'min': _rounded(low), 'max': _rounded(high)}
+        else:
+            keep = lttb(st, sv, points)
+            series[name] = {'t': st[keep].tolist(), 'v': _rounded(sv[keep])}
+    return series
@@ -1,43 +1,106 @@
 from django.shortcuts import render
 from django.http import JsonResponse
 from django.db.models import Sum, F
-from .models import VegetableSale, DailySummary, VegetableReport,ReportSummary
-from datetime import date
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-import io
+from .models import ChangeLogEntry, Shop, VegetableForecast, VegetableSale, DailySummary, VegetableReport,ReportSummary
+from . import catalog
+from .archive import ARCHIVED_MESSAGE, archived_sales, is_archived
+from .batching import run_write
+from .changes import record_changes
+from .charts import chart_figure, chart_options, client_hints, encode_figure_base64, figure_data_url, open_figure_count
+from .editing import EDITABLE_FIELDS, apply_sale_edits
+from .forecasting import forget_sales
+from .rollups import monthly_rollup
+from .sync import FEED_LIMIT, MAX_FEED_LIMIT, MAX_UPLOAD_OPERATIONS, apply_operation, change_feed
+from .timeseries import DEFAULT_POINTS, DOWNSAMPLE_MODES, MAX_POINTS, MIN_POINTS, downsample_series
+from .watchdog import current_rss_bytes, rss_limit_bytes
+from datetime import date, timedelta
+import json
+import os
 import numpy as np
-import urllib, base64
-from io import BytesIO
 
 
 
 
 
+def _archived_value(value):
+    """Archived columns store blank fields as NaN."""
+    return None if np.isnan(value) else float(value)
+
+
+def _day_sales(shop, day):
+    """Sales rows of ``shop`` on ``day`` as dicts, read from the archive when its month is archived."""
+    if not is_archived(shop, day):
+        return [
+            {'vegetable_id': sale.vegetable_id, 'vegetable': sale.vegetable.name, 'quantity': sale.quantity,
+             'purchase_price': sale.purchase_price, 'selling_price': sale.selling_price}
+            for sale in VegetableSale.objects.filter(shop=shop, date=day).select_related('vegetable')
+        ]
+
+    archived = archived_sales(shop, day, day)
+    if archived is None:
+        return []
+    names = catalog.vegetable_names(set(archived['vegetable_id'].tolist()))
+    return [
+        {'vegetable_id': veg_id, 'vegetable': names[veg_id], 'quantity': _archived_value(quantity),
+         'purchase_price': _archived_value(purchase), 'selling_price': _archived_value(selling)}
+        for veg_id, quantity, purchase, selling in zip(
+            archived['vegetable_id'].tolist(), archived['quantity'], archived['purchase_price'],
+            archived['selling_price'],
+        )
+    ]
+
+
+def _requested_day(request):
+    """The ``date`` query parameter as a date; None when missing or invalid."""
+    try:
+        return date.fromisoformat(request.GET.get('date', ''))
+    except ValueError:
+        return None
+
+
+@client_hints
 def vegetable_list(request):
     """Display all vegetables for the selected date, including default ones."""
     selected_date = request.session.get('selected_date', str(date.today()))
     selected_date = date.fromisoformat(selected_date)
 
+    if is_archived(request.shop, selected_date):
+        # Archived days are shown read-only, straight from the archive
+        return render(request, 'sales/vegetable_list.html', {
+            'vegetables': _day_sales(request.shop, selected_date),
+            'selected_date': selected_date,
+            'shop': request.shop,
+            'archived_message': ARCHIVED_MESSAGE,
+        })
+
     default_vegetables = ["Onion", "Tomato", "Potato", "Carrot", "Brinjal"]
 
     # Fetch existing vegetables for the selected date
-    existing_vegetables = VegetableSale.objects.filter(date=selected_date)
-    existing_vegetable_names = existing_vegetables.values_list('vegetable', flat=True)
+    existing_vegetables = VegetableSale.objects.filter(shop=request.shop, date=selected_date)
+    existing_vegetable_ids = set(existing_vegetables.values_list('vegetable_id', flat=True))
 
     # Add missing default vegetables
-    missing_vegetables = [veg for veg in default_vegetables if veg not in existing_vegetable_names]
-    VegetableSale.objects.bulk_create(
-        [VegetableSale(vegetable=veg, date=selected_date, quantity=None, purchase_price=None, selling_price=None) for veg in missing_vegetables]
-    )
+    default_ids = catalog.get_vegetable_ids(default_vegetables)
+    missing_vegetables = [veg_id for veg_id in default_ids.values() if veg_id not in existing_vegetable_ids]
+
+    def add_defaults():
+        VegetableSale.objects.bulk_create(
+            [VegetableSale(shop=request.shop, vegetable_id=veg_id, date=selected_date, quantity=None, purchase_price=None, selling_price=None) for veg_id in missing_vegetables]
+        )
+        record_changes(request.shop, ChangeLogEntry.SALE, existing_vegetables.filter(
+            vegetable_id__in=missing_vegetables
+        ).values_list('id', flat=True))
+
+    if missing_vegetables:
+        run_write(add_defaults)
 
     # Fetch updated vegetables list
-    vegetables = VegetableSale.objects.filter(date=selected_date)
+    vegetables = VegetableSale.objects.filter(shop=request.shop, date=selected_date).select_related('vegetable')
 
     return render(request, 'sales/vegetable_list.html', {
         'vegetables': vegetables,
-        'selected_date': selected_date
+        'selected_date': selected_date,
+        'shop': request.shop,
     })
 
 
@@ -51,6 +114,18 @@ def set_date(request):
     return JsonResponse({"success": False, "message": "Invalid date selection."})
 
 
+def set_shop(request):
+    """Save the selected shop in session so every view is scoped to it. Staff only."""
+    if not request.user.is_staff:
+        return JsonResponse({"success": False, "message": "Only staff can switch shops."}, status=403)
+    if request.method == "POST":
+        shop = Shop.objects.filter(slug=request.POST.get("shop", "")).first()
+        if shop:
+            request.session['shop_id'] = shop.id
+            return JsonResponse({"success": True, "message": f"Shop set to {shop.name}"})
+    return JsonResponse({"success": False, "message": "Invalid shop selection."})
+
+
 def add_vegetable(request):
     """Add a new vegetable for the selected date."""
     if request.method == "POST":
@@ -60,17 +135,25 @@ def add_vegetable(request):
 
         selected_date = request.session.get("selected_date", str(date.today()))
         selected_date = date.fromisoformat(selected_date)
+        if is_archived(request.shop, selected_date):
+            return JsonResponse({"success": False, "message": ARCHIVED_MESSAGE}, status=409)
 
-        vegetable, created = VegetableSale.objects.get_or_create(
-            vegetable=veg_name, date=selected_date,
-            defaults={"quantity": None, "purchase_price": None, "selling_price": None}
-        )
+        def add():
+            vegetable, created = VegetableSale.objects.get_or_create(
+                shop=request.shop, vegetable_id=catalog.get_vegetable_id(veg_name), date=selected_date,
+                defaults={"quantity": None, "purchase_price": None, "selling_price": None}
+            )
+            if created:
+                record_changes(request.shop, ChangeLogEntry.SALE, [vegetable.id])
+            return vegetable, created
+
+        vegetable, created = run_write(add)
 
         return JsonResponse({
             "success": True,
             "message": "Vegetable added successfully." if created else "Vegetable already exists.",
             "vegetable": {
-                "name": vegetable.vegetable,
+                "name": catalog.vegetable_names([vegetable.vegetable_id])[vegetable.vegetable_id],
                 "quantity": vegetable.quantity,
                 "purchase_price": vegetable.purchase_price,
                 "selling_price": vegetable.selling_price
@@ -83,11 +166,21 @@ def add_vegetable(request):
 def delete_vegetable(request):
     """Delete a vegetable for the selected date."""
     if request.method == "POST":
-        vegetable_name = request.POST.get("vegetable_name")
+        vegetable_id = catalog.get_vegetable_id(request.POST.get("vegetable_name", ""), create=False)
         selected_date = request.session.get("selected_date", str(date.today()))
         selected_date = date.fromisoformat(selected_date)
+        if is_archived(request.shop, selected_date):
+            return JsonResponse({"success": False, "message": ARCHIVED_MESSAGE}, status=409)
+
+        def delete():
+            rows = VegetableSale.objects.filter(shop=request.shop, vegetable_id=vegetable_id, date=selected_date)
+            ids = list(rows.values_list('id', flat=True))
+            deleted_count, _ = rows.delete()
+            record_changes(request.shop, ChangeLogEntry.SALE, ids, deleted=True)
+            forget_sales(request.shop, [(vegetable_id, selected_date)] if ids else [])
+            return deleted_count
 
-        deleted_count, _ = VegetableSale.objects.filter(vegetable=vegetable_name, date=selected_date).delete()
+        deleted_count = run_write(delete)
 
         if deleted_count > 0:
             return JsonResponse({"success": True, "message": f"Deleted {deleted_count} record(s)."})
@@ -99,27 +192,35 @@ def delete_vegetable(request):
 def calculate_totals(request):
     selected_date = request.session.get('selected_date', str(date.today()))
     selected_date = date.fromisoformat(selected_date)
+    if is_archived(request.shop, selected_date):
+        return JsonResponse({'success': False, 'message': ARCHIVED_MESSAGE}, status=409)
 
-    totals = VegetableSale.objects.filter(date=selected_date).aggregate(
-        total_purchase=Sum(F('quantity') * F('purchase_price')),
-        total_selling=Sum(F('quantity') * F('selling_price'))
-    )
+    def summarize():
+        totals = VegetableSale.objects.filter(shop=request.shop, date=selected_date).aggregate(
+            total_purchase=Sum(F('quantity') * F('purchase_price')),
+            total_selling=Sum(F('quantity') * F('selling_price'))
+        )
 
-    total_purchase = totals['total_purchase'] or 0
-    total_selling = totals['total_selling'] or 0
-    profit = max(0, total_selling - total_purchase)
-    loss = max(0, total_purchase - total_selling)
-
-    # Save or update the daily summary
-    DailySummary.objects.update_or_create(
-        date=selected_date,
-        defaults={
-            'total_purchase_price': total_purchase,
-            'total_selling_price': total_selling,
-            'total_profit': profit,
-            'total_loss': loss
-        }
-    )
+        total_purchase = totals['total_purchase'] or 0
+        total_selling = totals['total_selling'] or 0
+        profit = max(0, total_selling - total_purchase)
+        loss = max(0, total_purchase - total_selling)
+
+        # Save or update the daily summary
+        summary, _ = DailySummary.objects.update_or_create(
+            shop=request.shop, date=selected_date,
+            defaults={
+                'total_purchase_price': total_purchase,
+                'total_selling_price': total_selling,
+                'total_profit': profit,
+                'total_loss': loss
+            }
+        )
+        record_changes(request.shop, ChangeLogEntry.SUMMARY, [summary.id])
+        return total_purchase, total_selling, profit, loss
+
+    # Read and write in one transaction so the summary matches the rows it was computed from
+    total_purchase, total_selling, profit, loss = run_write(summarize)
 
     return JsonResponse({
         'success': True,
@@ -131,35 +232,81 @@ def calculate_totals(request):
 
 
 def save_data(request):
-    """Save updated vegetable data for the selected date."""
+    """Save updated vegetable data for the selected date.
+
+    Rows edited by another clerk since the page was loaded are not overwritten;
+    they are returned under ``conflicts`` with their current values.
+    """
     if request.method == "POST":
         selected_date = request.session.get('selected_date', str(date.today()))
         selected_date = date.fromisoformat(selected_date)
+        if is_archived(request.shop, selected_date):
+            return JsonResponse({"success": False, "message": ARCHIVED_MESSAGE}, status=409)
 
-        updated_vegetables = []
+        edits = []
         for key, value in request.POST.items():
             if key.startswith("quantity_"):
                 veg_id = key.split("_")[1]
                 try:
-                    vegetable = VegetableSale.objects.get(id=veg_id, date=selected_date)
-                    vegetable.quantity = float(value)
-                    vegetable.purchase_price = float(request.POST.get(f"purchase_price_{veg_id}", 0))
-                    vegetable.selling_price = float(request.POST.get(f"selling_price_{veg_id}", 0))
-                    updated_vegetables.append(vegetable)
-                except VegetableSale.DoesNotExist:
-                    continue
+                    version = int(request.POST[f"version_{veg_id}"])
+                except (KeyError, ValueError):
+                    return JsonResponse({"success": False, "message": "Every row needs its version; reload the page."}, status=400)
+                try:
+                    edits.append({
+                        "id": veg_id,
+                        "version": version,
+                        "quantity": float(value),
+                        "purchase_price": float(request.POST.get(f"purchase_price_{veg_id}", 0)),
+                        "selling_price": float(request.POST.get(f"selling_price_{veg_id}", 0)),
+                    })
+                except ValueError:
+                    return JsonResponse({"success": False, "message": "Quantity and prices must be numbers."}, status=400)
+
+        saved, conflicts = run_write(lambda: apply_sale_edits(request.shop, edits, selected_date))
+
+        if conflicts:
+            return JsonResponse({
+                "success": False,
+                "message": f"{len(conflicts)} row(s) were changed by someone else. Reload to see their values.",
+                "saved": saved,
+                "conflicts": conflicts,
+            }, status=409)
+        return JsonResponse({"success": True, "message": "Data saved successfully!", "saved": saved, "conflicts": []})
+
+    return JsonResponse({"success": False, "message": "Invalid request method."})
 
-        if updated_vegetables:
-            VegetableSale.objects.bulk_update(updated_vegetables, ["quantity", "purchase_price", "selling_price"])
 
-        return JsonResponse({"success": True, "message": "Data saved successfully!"})
+def bulk_edit(request):
+    """Apply a JSON batch of row edits, each checked against the row version the client saw.
 
-    return JsonResponse({"success": False, "message": "Invalid request method."})
+    Body: ``{"rows": [{"id": 1, "version": 3, "quantity": 2.5, ...}, ...]}``; ``version`` is required.
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "message": "Invalid request method."})
+
+    try:
+        rows = json.loads(request.body)["rows"]
+        edits = [
+            {"id": int(row["id"]), "version": int(row["version"]),
+             **{field: float(row[field]) for field in EDITABLE_FIELDS if row.get(field) is not None}}
+            for row in rows
+        ]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"success": False, "message": "Invalid edit payload."}, status=400)
+
+    saved, conflicts = run_write(lambda: apply_sale_edits(request.shop, edits))
+
+    return JsonResponse({
+        "success": not conflicts,
+        "saved": saved,
+        "conflicts": conflicts,
+    }, status=409 if conflicts else 200)
 
 
 
 
 
+@client_hints
 def report_page(request):
     selected_date = request.GET.get('date') or request.POST.get('selected_date')
     show_chart = 'show_chart' in request.POST  # Detect if user clicked "Quantity Analysis"
@@ -168,15 +315,22 @@ def report_page(request):
     summary = None
     chart_url = None
 
-    if selected_date:
-        entries = VegetableSale.objects.filter(date=selected_date)
-        filtered_entries = entries.filter(quantity__gt=0) | entries.filter(purchase_price__gt=0) | entries.filter(selling_price__gt=0)
+    try:
+        day = date.fromisoformat(selected_date) if selected_date else None
+    except ValueError:
+        day, message = None, "Invalid date."
+
+    if day:
+        filtered_entries = [
+            entry for entry in _day_sales(request.shop, day)
+            if (entry['quantity'] or 0) > 0 or (entry['purchase_price'] or 0) > 0 or (entry['selling_price'] or 0) > 0
+        ]
 
-        if not filtered_entries.exists():
+        if not filtered_entries:
             message = "No vegetables were purchased on this date."
         else:
             # Clear previous report
-            VegetableReport.objects.filter(date=selected_date).delete()
+            VegetableReport.objects.filter(shop=request.shop, date=day).delete()
 
             total_purchase_sum = 0
             total_selling_sum = 0
@@ -184,9 +338,9 @@ def report_page(request):
             total_loss = 0
 
             for entry in filtered_entries:
-                quantity = entry.quantity or 0
-                purchase_price = entry.purchase_price or 0
-                selling_price = entry.selling_price or 0
+                quantity = entry['quantity'] or 0
+                purchase_price = entry['purchase_price'] or 0
+                selling_price = entry['selling_price'] or 0
 
                 total_purchase = purchase_price * quantity
                 total_selling = selling_price * quantity
@@ -199,8 +353,9 @@ def report_page(request):
                 total_loss += loss
 
                 VegetableReport.objects.create(
-                    date=selected_date,
-                    vegetable=entry.vegetable,
+                    shop=request.shop,
+                    date=day,
+                    vegetable_id=entry['vegetable_id'],
                     quantity=quantity,
                     purchase_price=purchase_price,
                     selling_price=selling_price,
@@ -211,7 +366,7 @@ def report_page(request):
                 )
 
                 data.append({
-                    'vegetable': entry.vegetable,
+                    'vegetable': entry['vegetable'],
                     'quantity': quantity,
                     'purchase_price': purchase_price,
                     'selling_price': selling_price,
@@ -222,7 +377,7 @@ def report_page(request):
                 })
 
             summary, created = ReportSummary.objects.update_or_create(
-                date=selected_date,
+                shop=request.shop, date=day,
                 defaults={
                     'total_purchase': total_purchase_sum,
                     'total_selling': total_selling_sum,
@@ -238,21 +393,16 @@ def report_page(request):
                 base_colors = ['lightcoral', 'gold', 'lightsalmon', 'plum', 'skyblue', 'lightgreen', 'khaki', 'lightpink', 'peachpuff', 'aquamarine']
                 colors = [base_colors[i % len(base_colors)] for i in range(len(vegetables))]
 
-                plt.figure(figsize=(8,4))
-                plt.bar(vegetables, quantities, color=colors,width=0.5)
-                plt.xlabel('Vegetables')
-                plt.ylabel('Quantity')
-                plt.title(f'Quantity Analysis for {selected_date}')
-                plt.xticks(rotation=45)
-                plt.tight_layout()
-
-                buffer = BytesIO()
-                plt.savefig(buffer, format='png')
-                buffer.seek(0)
-                image_png = buffer.getvalue()
-                buffer.close()
-                chart_url = 'data:image/png;base64,' + base64.b64encode(image_png).decode('utf-8')
-                plt.close()
+                options = chart_options(request, (800, 400))
+                with chart_figure(options) as (fig, ax):
+                    ax.bar(vegetables, quantities, color=colors,width=0.5)
+                    ax.set_xlabel('Vegetables')
+                    ax.set_ylabel('Quantity')
+                    ax.set_title(f'Quantity Analysis for {selected_date}')
+                    ax.tick_params(axis='x', labelrotation=45)
+                    fig.tight_layout()
+
+                    chart_url = figure_data_url(fig, options)
 
     return render(request, 'sales/report.html', {
         'data': data,
@@ -263,91 +413,81 @@ def report_page(request):
     })
 
 def price_chart(request):
-    selected_date = request.GET.get('date')
+    selected_date = _requested_day(request)
 
     if not selected_date:
         return JsonResponse({'error': 'Date not provided'}, status=400)
 
-    data = VegetableSale.objects.filter(date=selected_date)
+    data = _day_sales(request.shop, selected_date)
 
-    if not data.exists():
+    if not data:
         return JsonResponse({'error': 'No data found for selected date'}, status=404)
 
-    vegetables = [veg.vegetable for veg in data]
-    purchase_prices = [veg.purchase_price for veg in data]
-    selling_prices = [veg.selling_price for veg in data]
+    vegetables = [veg['vegetable'] for veg in data]
+    purchase_prices = [veg['purchase_price'] for veg in data]
+    selling_prices = [veg['selling_price'] for veg in data]
 
     # Create a line chart
-    plt.figure(figsize=(10, 5))
-    plt.plot(vegetables, purchase_prices, marker='o', label='Purchase Price', color='green')
-    plt.plot(vegetables, selling_prices, marker='o', label='Selling Price', color='orange')
-    plt.title(f'Price Analysis for {selected_date}')
-    plt.xlabel('Vegetables')
-    plt.ylabel('Price (per kg)')
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    image_png = buffer.getvalue()
-    buffer.close()
-    plt.close()  # Important to close the plot to free memory
-
-    chart_base64 = base64.b64encode(image_png).decode('utf-8')
-
-    return JsonResponse({'chart': chart_base64})
+    options = chart_options(request, (1000, 500))
+    with chart_figure(options) as (fig, ax):
+        ax.plot(vegetables, purchase_prices, marker='o', label='Purchase Price', color='green')
+        ax.plot(vegetables, selling_prices, marker='o', label='Selling Price', color='orange')
+        ax.set_title(f'Price Analysis for {selected_date}')
+        ax.set_xlabel('Vegetables')
+        ax.set_ylabel('Price (per kg)')
+        ax.legend()
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
+
+        chart_base64 = encode_figure_base64(fig, options)
+
+    return JsonResponse({'chart': chart_base64, 'format': options.format, 'mime': options.mime})
 
 def grouped_bar_chart(request):
-    selected_date = request.GET.get('date')
+    selected_date = _requested_day(request)
 
     if selected_date:
-        sales = VegetableSale.objects.filter(date=selected_date)
+        sales = _day_sales(request.shop, selected_date)
 
-        labels = [sale.vegetable for sale in sales]
-        purchase_totals = [sale.purchase_price * sale.quantity for sale in sales]
-        selling_totals = [sale.selling_price * sale.quantity for sale in sales]
+        labels = [sale['vegetable'] for sale in sales]
+        # Rows added but not filled in yet have no quantity or prices
+        purchase_totals = [(sale['purchase_price'] or 0) * (sale['quantity'] or 0) for sale in sales]
+        selling_totals = [(sale['selling_price'] or 0) * (sale['quantity'] or 0) for sale in sales]
 
         x = np.arange(len(labels))
         width = 0.35
 
-        fig, ax = plt.subplots()
-        ax.bar(x - width/2, purchase_totals, width, label='Purchase', color='orange')
-        ax.bar(x + width/2, selling_totals, width, label='Selling', color='green')
+        options = chart_options(request, (640, 480))
+        with chart_figure(options) as (fig, ax):
+            ax.bar(x - width/2, purchase_totals, width, label='Purchase', color='orange')
+            ax.bar(x + width/2, selling_totals, width, label='Selling', color='green')
 
-        ax.set_xlabel('Vegetables')
-        ax.set_ylabel('Price')
-        ax.set_title(f'Purchase vs Selling Price on {selected_date}')
-        ax.set_xticks(x)
-        ax.set_xticklabels(labels, rotation=45)
-        ax.legend()
-        plt.tight_layout()
+            ax.set_xlabel('Vegetables')
+            ax.set_ylabel('Price')
+            ax.set_title(f'Purchase vs Selling Price on {selected_date}')
+            ax.set_xticks(x)
+            ax.set_xticklabels(labels, rotation=45)
+            ax.legend()
+            fig.tight_layout()
 
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        image_png = buffer.getvalue()
-        buffer.close()
-        chart = base64.b64encode(image_png).decode('utf-8')
-        plt.close()
+            chart = encode_figure_base64(fig, options)
 
-        return JsonResponse({'chart': chart})
+        return JsonResponse({'chart': chart, 'format': options.format, 'mime': options.mime})
     else:
         return JsonResponse({'error': 'Date not provided'}, status=400)
     
 def stacked_profit_loss_chart(request):
-    selected_date = request.GET.get('date')
+    selected_date = _requested_day(request)
 
     if selected_date:
-        sales = VegetableSale.objects.filter(date=selected_date)
+        sales = _day_sales(request.shop, selected_date)
 
-        labels = [sale.vegetable for sale in sales]
+        labels = [sale['vegetable'] for sale in sales]
         profit_values = []
         loss_values = []
 
         for sale in sales:
-            profit_or_loss = (sale.selling_price - sale.purchase_price) * sale.quantity
+            profit_or_loss = ((sale['selling_price'] or 0) - (sale['purchase_price'] or 0)) * (sale['quantity'] or 0)
             if profit_or_loss > 0:
                 profit_values.append(profit_or_loss)
                 loss_values.append(0)
@@ -358,32 +498,28 @@ def stacked_profit_loss_chart(request):
         x = np.arange(len(labels))
         width = 0.6
 
-        fig, ax = plt.subplots()
-        ax.bar(x, profit_values, width, label='Profit', color='green')
-        ax.bar(x, loss_values, width, bottom=profit_values, label='Loss', color='red')
+        options = chart_options(request, (640, 480))
+        with chart_figure(options) as (fig, ax):
+            ax.bar(x, profit_values, width, label='Profit', color='green')
+            ax.bar(x, loss_values, width, bottom=profit_values, label='Loss', color='red')
 
-        ax.set_xlabel('Vegetables')
-        ax.set_ylabel('Amount')
-        ax.set_title(f'Stacked Profit and Loss Chart on {selected_date}')
-        ax.set_xticks(x)
-        ax.set_xticklabels(labels, rotation=45)
-        ax.legend()
-        plt.tight_layout()
+            ax.set_xlabel('Vegetables')
+            ax.set_ylabel('Amount')
+            ax.set_title(f'Stacked Profit and Loss Chart on {selected_date}')
+            ax.set_xticks(x)
+            ax.set_xticklabels(labels, rotation=45)
+            ax.legend()
+            fig.tight_layout()
 
-        buffer = BytesIO()
-        plt.savefig(buffer, format='png')
-        buffer.seek(0)
-        image_png = buffer.getvalue()
-        buffer.close()
-        chart = base64.b64encode(image_png).decode('utf-8')
-        plt.close()
+            chart = encode_figure_base64(fig, options)
 
-        return JsonResponse({'chart': chart})
+        return JsonResponse({'chart': chart, 'format': options.format, 'mime': options.mime})
     else:
         return JsonResponse({'error': 'Date not provided'}, status=400)
     
 
 
+@client_hints
 def monthly_analysis(request):
     return render(request, 'sales/monthly-analysis.html')
 
@@ -396,89 +532,191 @@ def monthly_analysis_data(request):
 
     try:
         year, month = map(int, month_str.split('-'))
+        month_start = date(year, month, 1)
     except ValueError:
         return JsonResponse({'error': 'Invalid month format'}, status=400)
+    month_end = date(year + month // 12, month % 12 + 1, 1)
+
+    # A plain date range keeps the lookup on the (shop, date) index
+    sales = VegetableSale.objects.filter(shop=request.shop, date__gte=month_start, date__lt=month_end)
+
+    rows = np.array(
+        list(sales.values_list('vegetable_id', 'quantity', 'purchase_price', 'selling_price')),
+        dtype=np.float64,
+    ).reshape(-1, 4)
+    archived = archived_sales(request.shop, month_start, month_end - timedelta(days=1))
+    if archived is not None:
+        rows = np.vstack([rows, np.column_stack([
+            archived['vegetable_id'], archived['quantity'], archived['purchase_price'], archived['selling_price'],
+        ])])
+    vegetable_data, summary_data = monthly_rollup(rows[:, 0], rows[:, 1], rows[:, 2], rows[:, 3])
 
-    sales = VegetableSale.objects.filter(date__year=year, date__month=month)
+    # 🎯 Quantity Analysis Chart using matplotlib
+    vegetable_names = [item['vegetable'] for item in vegetable_data]
+    quantities = [item['quantity'] for item in vegetable_data]
 
-    total_investment = 0
-    total_revenue = 0
-    total_profit = 0
-    total_loss = 0
-    result = {}
+    options = chart_options(request, (800, 500))
+    with chart_figure(options) as (fig, ax):
+        bars = ax.bar(vegetable_names, quantities, color='lightgreen')
+        ax.set_xlabel('Vegetables')
+        ax.set_ylabel('Total Quantity')
+        ax.set_title(f'Vegetable Quantity Analysis - {month_str}')
+        ax.tick_params(axis='x', labelrotation=45)
+        fig.tight_layout()
 
-    for sale in sales:
-        vegetable_name = sale.vegetable
+        for bar in bars:
+            height = bar.get_height()
+            ax.annotate(f'{height}', xy=(bar.get_x() + bar.get_width() / 2, height),
+                         xytext=(0, 3), textcoords="offset points", ha='center')
 
-        if vegetable_name not in result:
-            result[vegetable_name] = {
-                'quantity': 0,
-                'profit': 0,
-                'loss': 0,
-                'total_purchase_value': 0,
-                'total_selling_value': 0
-            }
+        chart_url = figure_data_url(fig, options)
 
-        if sale.purchase_price is not None and sale.selling_price is not None and sale.quantity is not None:
-            purchase_value = sale.purchase_price * sale.quantity
-            selling_value = sale.selling_price * sale.quantity
+    return JsonResponse({
+        'vegetables': vegetable_data,
+        'summary': summary_data,
+        'quantity_chart': chart_url,  # 📊 Base64 image chart included
+    })
 
-            result[vegetable_name]['total_purchase_value'] += purchase_value
-            result[vegetable_name]['total_selling_value'] += selling_value
-            result[vegetable_name]['quantity'] += sale.quantity
 
-            profit_or_loss = (sale.selling_price - sale.purchase_price) * sale.quantity
-            if profit_or_loss >= 0:
-                result[vegetable_name]['profit'] += profit_or_loss
-                total_profit += profit_or_loss
-            else:
-                result[vegetable_name]['loss'] += abs(profit_or_loss)
-                total_loss += abs(profit_or_loss)
+def vegetable_timeseries(request):
+    """Price and quantity trend of one vegetable over a date range, downsampled server-side.
 
-            total_investment += purchase_value
-            total_revenue += selling_value
+    Query params: ``vegetable``, ``start``/``end`` (YYYY-MM-DD, optional), ``points``
+    (target size per series) and ``mode`` (``lttb`` or ``minmax``). Days are sent as
+    offsets from ``start`` to keep the payload small.
+    """
+    vegetable_id = catalog.get_vegetable_id(request.GET.get('vegetable', ''), create=False)
+    if vegetable_id is None:
+        return JsonResponse({'error': 'Unknown vegetable'}, status=404)
 
-    vegetable_data = [
-        {'vegetable': k, 'quantity': v['quantity'], 'profit': v['profit'], 'loss': v['loss']}
-        for k, v in result.items()
-    ]
+    try:
+        end = date.fromisoformat(request.GET['end']) if request.GET.get('end') else date.today()
+        start = date.fromisoformat(request.GET['start']) if request.GET.get('start') else None
+        points = int(request.GET.get('points') or DEFAULT_POINTS)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date range or point count'}, status=400)
+    points = max(MIN_POINTS, min(MAX_POINTS, points))
+    mode = request.GET.get('mode', 'lttb')
+    if mode not in DOWNSAMPLE_MODES:
+        return JsonResponse({'error': 'Invalid mode'}, status=400)
+
+    # Equality on (shop, vegetable) plus a date range walks the unique index in date order
+    sales = VegetableSale.objects.filter(shop=request.shop, vegetable_id=vegetable_id, date__lte=end)
+    if start is not None:
+        sales = sales.filter(date__gte=start)
+    rows = list(sales.order_by('date').values_list('date', 'quantity', 'purchase_price', 'selling_price'))
+    days = np.fromiter((row[0].toordinal() for row in rows), dtype=np.int64, count=len(rows))
+    values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(-1, 3)
+
+    # Closed months moved out by archive_sales are read from their memory-mapped columns
+    archived = archived_sales(request.shop, start or date.min, end, vegetable_id)
+    if archived is not None:
+        days = np.concatenate([archived['date'], days])
+        values = np.vstack([
+            np.column_stack([archived['quantity'], archived['purchase_price'], archived['selling_price']]), values,
+        ])
+        order = np.argsort(days, kind='stable')
+        days, values = days[order], values[order]
+
+    if not len(days):
+        return JsonResponse({'error': 'No data found for selected range'}, status=404)
+    if start is None:
+        start = date.fromordinal(int(days[0]))
+
+    t = days - start.toordinal()
+    series = downsample_series(t, {
+        'quantity': values[:, 0],
+        'purchase_price': values[:, 1],
+        'selling_price': values[:, 2],
+    }, points, mode)
 
-    summary_data = {
-        'total_investment': total_investment,
-        'total_revenue': total_revenue,
-        'total_profit': total_profit,
-        'total_loss': total_loss,
-    }
+    return JsonResponse({
+        'vegetable': catalog.vegetable_names([vegetable_id])[vegetable_id],
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'mode': mode,
+        'raw_points': len(days),
+        'series': series,
+    })
 
-    # 🎯 Quantity Analysis Chart using matplotlib
-    vegetable_names = [item['vegetable'] for item in vegetable_data]
-    quantities = [item['quantity'] for item in vegetable_data]
 
-    plt.figure(figsize=(8, 5))
-    bars = plt.bar(vegetable_names, quantities, color='lightgreen')
-    plt.xlabel('Vegetables')
-    plt.ylabel('Total Quantity')
-    plt.title(f'Vegetable Quantity Analysis - {month_str}')
-    plt.xticks(rotation=45)
-    plt.tight_layout()
-
-    for bar in bars:
-        height = bar.get_height()
-        plt.annotate(f'{height}', xy=(bar.get_x() + bar.get_width() / 2, height),
-                     xytext=(0, 3), textcoords="offset points", ha='center')
-
-    buffer = io.BytesIO()
-    plt.savefig(buffer, format='png')
-    buffer.seek(0)
-    image_png = buffer.getvalue()
-    buffer.close()
-    plt.close()
-
-    image_base64 = base64.b64encode(image_png).decode('utf-8')
-    chart_url = f'data:image/png;base64,{image_base64}'
+def sync_changes(request):
+    """Change feed for offline clients: rows changed since ``cursor`` (0 for a full sync)."""
+    try:
+        cursor = int(request.GET.get('cursor') or 0)
+        limit = min(int(request.GET.get('limit') or FEED_LIMIT), MAX_FEED_LIMIT)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid cursor or limit'}, status=400)
+
+    return JsonResponse(change_feed(request.shop, cursor, max(limit, 1)))
+
+
+def sync_upload(request):
+    """Apply a batch of offline operations, each at most once per ``op_id``.
+
+    Body: ``{"operations": [{"op_id": "...", "type": "upsert_sale", "date": "YYYY-MM-DD",
+    "vegetable": "Tomato", "quantity": 2, "version": 3, ...}, ...]}``
+    """
+    if request.method != "POST":
+        return JsonResponse({"success": False, "message": "Invalid request method."})
+
+    try:
+        operations = json.loads(request.body)["operations"]
+        if not all(isinstance(op, dict) and op.get("op_id") for op in operations):
+            raise ValueError
+        # Upserts carry the version the client last saw, or null for a row it never had
+        if any(op.get("type") == "upsert_sale" and "version" not in op for op in operations):
+            raise ValueError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({"success": False, "message": "Invalid operations payload."}, status=400)
+    if len(operations) > MAX_UPLOAD_OPERATIONS:
+        return JsonResponse({"success": False, "message": f"At most {MAX_UPLOAD_OPERATIONS} operations per upload."}, status=400)
+
+    results = [run_write(lambda op=op: apply_operation(request.shop, op)) for op in operations]
+
+    return JsonResponse({"success": True, "results": results})
+
+
+def reorder_suggestions(request):
+    """Suggested purchase quantity per vegetable for ``date`` (default tomorrow).
+
+    Served from the precomputed forecasts in one query; each suggestion is based
+    on the sales up to its ``based_on`` day.
+    """
+    try:
+        target = date.fromisoformat(request.GET['date']) if request.GET.get('date') else date.today() + timedelta(days=1)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid date'}, status=400)
+
+    forecasts = (
+        VegetableForecast.objects.filter(shop=request.shop, last_date__lt=target)
+        .select_related('vegetable')
+        .order_by('vegetable__name')
+    )
 
     return JsonResponse({
-        'vegetables': vegetable_data,
-        'summary': summary_data,
-        'quantity_chart': chart_url,  # 📊 Base64 image chart included
+        'date': target.isoformat(),
+        'suggestions': [
+            {
+                'vegetable': forecast.vegetable.name,
+                'suggested_quantity': forecast.suggested_quantity,
+                'expected_quantity': round(forecast.quantity_mean, 2),
+                'quantity_std': round(forecast.quantity_var ** 0.5, 2),
+                'margin_per_unit': round(forecast.margin_mean, 2),
+                'expected_loss': round(forecast.loss_mean, 2),
+                'based_on': forecast.last_date.isoformat(),
+                'observations': forecast.observations,
+            }
+            for forecast in forecasts
+        ],
+    })
+
+
+def worker_metrics(request):
+    """Per-worker health numbers for monitoring chart rendering leaks."""
+    return JsonResponse({
+        'pid': os.getpid(),
+        'open_figures': open_figure_count(),
+        'rss_bytes': current_rss_bytes(),
+        'rss_limit_bytes': rss_limit_bytes(),
     })
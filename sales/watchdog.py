@@ -0,0 +1,38 @@
+import os
+
+from django.conf import settings
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+
+def current_rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def rss_limit_bytes():
+    limit_mb = getattr(settings, 'WORKER_MAX_RSS_MB', 0)
+    return limit_mb * 1024 * 1024 if limit_mb else None
+
+
+def check_worker_memory(worker):
+    """Ask a gunicorn worker to exit once it has grown past WORKER_MAX_RSS_MB.
+
+    Clearing ``worker.alive`` lets the worker finish its current request and
+    exit cleanly; the arbiter then starts a fresh one in its place.
+    """
+    limit = rss_limit_bytes()
+    rss = current_rss_bytes()
+    if limit is None or rss is None or rss <= limit:
+        return False
+
+    worker.log.warning(
+        "Worker %s RSS %.0f MB is above the %.0f MB limit; recycling",
+        worker.pid, rss / 1024 / 1024, limit / 1024 / 1024,
+    )
+    worker.alive = False
+    return True